@@ -0,0 +1,165 @@
+"""
+Throughput comparison of the objects.inv parsing engine (utils/loc_objInvParser.py)
+`- against the original split_lines/read_chunks implementation of getObjInvDisplayLists
+
+Synthetic Sphinx v2 inventories of increasing size are written to a temporary folder,
+`- each is parsed by both implementations, the results are checked for equality
+ - and the best-of-N wall clock times (plus lines/sec throughput) are reported
+
+Run from the plugin root folder (outside of Sublime Text):
+    python bench/bench_objInvParser.py [--lines 10000 100000 1000000] [--repeat 3] [--roles term]
+Use --roles to compare a single ref type request (e.g. "Glossary Terms") where the engine skips unrequested lines
+Note: Sublime Text only loads plugin .py files from the package root, so this folder is never loaded
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.loc_objInvParser import parseObjInvEntries  # noqa: E402
+
+validRefTypesList = ['doc', 'label', 'term']
+
+
+def writeSyntheticInventory(pathStr, lineCount):
+    """
+    Write a Sphinx v2 objects.inv with 'lineCount' entries, mixing std:doc/label/term entries
+    `- with (much more common) py: domain entries, as found in large API reference inventories
+    """
+    roleCycle = ['py:function', 'py:class', 'std:label', 'py:method', 'std:doc',
+                 'py:attribute', 'std:term', 'py:module', 'c:macro', 'py:data']
+    lines = []
+    for i in range(lineCount):
+        entrytype = roleCycle[i % len(roleCycle)]
+        if entrytype == 'std:label':
+            lines.append(f'section-{i} std:label -1 chapter/{i // 50}.html#$ Section title number {i}')
+        elif entrytype == 'std:doc':
+            lines.append(f'chapter/page_{i} std:doc -1 chapter/page_{i}.html Page title {i} été')
+        elif entrytype == 'std:term':
+            lines.append(f'glossary term {i} std:term -1 glossary.html#term-{i} -')
+        else:
+            lines.append(f'pkg.module{i // 100}.Object{i} {entrytype} 1 api/module{i // 100}.html#$ -')
+    body = ('\n'.join(lines) + '\n').encode('utf-8')
+    with open(pathStr, 'wb') as f:
+        f.write(b'# Sphinx inventory version 2\n'
+                b'# Project: Synthetic\n'
+                b'# Version: 1.0\n'
+                b'# The remainder of this file is compressed using zlib.\n')
+        f.write(zlib.compress(body, 9))
+
+
+def legacyParse(objInvPathStr, refTypeTargetList=validRefTypesList):
+    """
+    The original getObjInvDisplayLists parsing loop (prefix handling removed), kept for comparison
+    """
+    datalist = []
+    displaylist = []
+    bufsize = 16 * 1024
+
+    def read_chunks():
+        decompressor = zlib.decompressobj()
+        for chunk in iter(lambda: f.read(bufsize), b''):
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    def split_lines(iter):
+        buf = b''
+        for chunk in iter:
+            buf += chunk
+            lineend = buf.find(b'\n')
+            while lineend != -1:
+                yield buf[:lineend].decode('utf-8')
+                buf = buf[lineend + 1:]
+                lineend = buf.find(b'\n')
+        assert not buf
+
+    with open(objInvPathStr, 'rb') as f:
+        for _ in range(4):
+            f.readline()
+        dataMappings = defaultdict(list)
+        displayMappings = defaultdict(list)
+        for line in split_lines(read_chunks()):
+            m = re.match(r'(?x)(.+?)\s+(\S*:\S*)\s+(\S+)\s+(\S+)\s+(.*)', line.rstrip())
+            if not m:
+                continue
+            name, entrytype, prio, location, dispname = m.groups()
+            if location.endswith(u'$'):
+                location = location[:-1] + name
+            if dispname == "-":
+                dispname = name
+            if entrytype.startswith("std:"):
+                lineRefType = entrytype[4:]
+                if lineRefType in validRefTypesList:
+                    if lineRefType == "label":
+                        insertStr = ":ref:`{}`".format(name)
+                        displayStr = ">section: {} (ref:{})".format(dispname, name)
+                    elif lineRefType == "doc":
+                        insertStr = ":doc:`{}`".format(name)
+                        displayStr = ">page: {} (doc:{})".format(dispname, name)
+                    elif lineRefType == "term":
+                        insertStr = ":term:`{}`".format(name)
+                        displayStr = ">glossary_term: {} (term:{})".format(dispname, name)
+                    dataMappings[lineRefType].append(insertStr)
+                    displayMappings[lineRefType].append(displayStr)
+        for x in refTypeTargetList:
+            datalist.extend(dataMappings[x])
+            displaylist.extend(displayMappings[x])
+    return datalist, displaylist
+
+
+def engineParse(objInvPathStr, refTypeTargetList=validRefTypesList):
+    """
+    The same output as legacyParse, produced via the new parsing engine
+    """
+    roleStrs = {'label': ('ref', 'section'), 'doc': ('doc', 'page'), 'term': ('term', 'glossary_term')}
+    datalist = []
+    displaylist = []
+    store = parseObjInvEntries(objInvPathStr, [('std', refType) for refType in refTypeTargetList])
+    for refType in refTypeTargetList:
+        roleStr, displayLabel = roleStrs[refType]
+        for name, dispname in store.getColumn(('std', refType)).iterRows():
+            datalist.append(f":{roleStr}:`{name}`")
+            displaylist.append(f">{displayLabel}: {dispname} ({roleStr}:{name})")
+    return datalist, displaylist
+
+
+def bestOf(func, repeat, *args):
+    bestTime = None
+    result = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - startTime
+        if bestTime is None or elapsed < bestTime:
+            bestTime = elapsed
+    return bestTime, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--roles', nargs='+', choices=validRefTypesList, default=validRefTypesList)
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'legacy s':>10} {'engine s':>10} {'legacy l/s':>12} {'engine l/s':>12} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for lineCount in args.lines:
+            invPath = os.path.join(tmpDir, f'objects_{lineCount}.inv')
+            writeSyntheticInventory(invPath, lineCount)
+            legacyTime, legacyResult = bestOf(legacyParse, args.repeat, invPath, args.roles)
+            engineTime, engineResult = bestOf(engineParse, args.repeat, invPath, args.roles)
+            if legacyResult != engineResult:
+                sys.exit(f'Result mismatch between implementations for {lineCount} lines')
+            print(f'{lineCount:>10} {legacyTime:>10.3f} {engineTime:>10.3f} '
+                  f'{lineCount / legacyTime:>12,.0f} {lineCount / engineTime:>12,.0f} '
+                  f'{legacyTime / engineTime:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
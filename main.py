@@ -2,20 +2,43 @@ from .utils.lnk_devLoadRefreshUtils import devStartupShim; devStartupShim()
 from .utils.lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
 
 import os
-import re
-from urllib.parse import urlsplit
+import html
+import time
+import threading
 import sublime
 import sublime_plugin
 
 
 from .utils import lnk_ioUtils
-from .utils.lnk_parsingUtils import get_combo_plugin_settings, get_project_plugin_settings, getPyFileVars, getSettingsVars
+from .utils.lnk_parsingUtils import get_combo_plugin_settings, get_project_plugin_settings, getSettingsVars
+from .utils.loc_projectContext import getProjectContext, projectRoots, forgetView
 from .utils.loc_constants import settingsControl
-from .utils.loc_intersphinxHelpers import getThinIntersphinxMap, validRefTypesList, getObjInvDisplayLists
+from .utils.loc_intersphinxHelpers import getThinIntersphinxMap, validRefTypesList, refTypeToEntryType, loadObjInvStores, inventoryLinkList
+from .utils.loc_intersphinxHelpers import syncInvSearchIndex, inventoryLinkSearch, getObjInvStore
+from .utils.loc_invCache import setInvMemoryCacheLimit, getRemoteInvFetcher, getInvSearchIndex
+from .utils.loc_citeIndex import citeIndex, citationEncodedPosition
+from .utils.loc_substIndex import substIndex, substitutionSourceExtensions
+from .utils.loc_confPy import getConfPyVars
 
 pluginName = __package__.split('.')[0]
 settings = settingsControl
 
+def get_intersphinx_inv_jobs(givenMap, topFolderPath, targetKeyList=[], window=None):
+    """
+    Return a list of (intersphinx key, objects.inv path) jobs, in intersphinx map order, for the targetKeyList
+    `- keys (all keys if empty) of an intersphinx_mapping, see getThinIntersphinxMap
+    The plugin settings used are those of 'window' (the active window if None)
+    """
+    # parsed inventories are held in a process-wide LRU cache shared by all windows and command variants
+    setInvMemoryCacheLimit(settings.getOne('inventory_cache_max_mb', window=window))
+    # remote inventories are used from a local cache, which is filled/refreshed in the background
+    remoteFetcher = None
+    if settings.getOne('remote_inventory_fetch', window=window):
+        remoteFetcher = getRemoteInvFetcher(settings.getOne('remote_inventory_ttl_hours', window=window))
+    simpleMap = getThinIntersphinxMap(givenMap, topFolderPath, targetKeyList, remoteFetcher=remoteFetcher)
+    return [(thisKey, extantPath) for thisKey, objInvPaths in simpleMap.items() for extantPath in objInvPaths]
+
+
 class CiteFromBiblioFilesCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.TextCommand):
     """
     Parses a list of files to regex search for sphinx project bibliographies
@@ -24,38 +47,27 @@ class CiteFromBiblioFilesCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.
     An external utility then constructs a dictionary of cit / ref pairs from the parsed bibliography
     Presents to user (in sublime's quick panel) a list of references
     If the user selects one the citation is put in at the cursor position
+    The definition of the highlighted citation is previewed in its bibliographic file
     """
     def on_done(self, index):
         """Callback function for sublime's quick-menu presentation of citations
         """
+        if self.previewed:
+            # close any citation definition preview by going back to the view being edited
+            self.view.window().focus_view(self.view)
         if index == -1:
             # noop; nothing was selected, e.g. the user pressed escape
             return
         else:
             self.view.run_command('insert', {"characters": self.insert_list[index]})
 
-    def get_refs_from_file(self, filename):
-        """
-        Opens the filename and parses it (regex) to find restructured text citation lines of the kind:
-           ".. [author_yr] Author, 1966 Great Book"
-        or in regex capture group terms:
-           ".. [<cite_label>] <cite_text>"
-        Care is taken to avoid footnotes, which have an almost identical syntax to citations.
-        The <cite_label> must not begin with a '#' or a numerical digit, or it will be deemed a footnote reference.
-        Found citation lines are parsed into a dictionary: { cite_label: cite_line } and returned
+    def on_highlight(self, index):
+        """Preview the definition of the highlighted citation in its bibliographic file
         """
-        pattern = re.compile(r"""
-            ^\.\.\s+\[
-            (?P<cite_label>[^#\d].*?)\]\s+
-            (?P<cite_text>.*)$
-            """, re.VERBOSE | re.MULTILINE)
-        with open(filename, 'r') as reffile:
-            # Read file object to string
-            text = reffile.read()
-        found = re.findall(pattern, text)
-        if found:
-            return dict(found)
-        return None
+        encodedPosition = citationEncodedPosition(*self.location_list[index])
+        if encodedPosition is not None:
+            self.previewed = True
+            self.view.window().open_file(encodedPosition, sublime.ENCODED_POSITION | sublime.TRANSIENT)
 
     def is_enabled(self, **kwargs):
         return bool(settings.getOne('bib_ref_file_list'))
@@ -67,40 +79,30 @@ class CiteFromBiblioFilesCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.
         if not cite_file_list:
             # this shouldn't happen as command is disabled if no cite file data is available
             return
-        subl_top_folder_path = self.view.window().extract_variables()["folder"]
-        citeFileCount = len(cite_file_list)
-        datalessFileList = []
-        unreadableFileList = []
-        dataYieldingFileCount = 0
-        single_parse_result = {}
-        collect_parse_result = {}
-        for f in cite_file_list:
-            fq_ref_file = os.path.normpath(os.path.join(subl_top_folder_path, f))
-            if not os.access(fq_ref_file, os.R_OK):
-                unreadableFileList += [f]
-            else:
-                single_parse_result = self.get_refs_from_file(fq_ref_file)
-                if single_parse_result:
-                    collect_parse_result.update(single_parse_result)
-                    dataYieldingFileCount += 1
-                else:
-                    datalessFileList += [f]
-
-        if unreadableFileList:
-            for duffOne in unreadableFileList:
+        subl_top_folder_path = getProjectContext(self.view).topFolderPath
+        # (the panel lists are shared with later runs, and must not be modified)
+        panelLists = citeIndex.getPanelLists(cite_file_list, subl_top_folder_path,
+                                             settings.getOne('citation_scan_workers'))
+        citeFileCount = panelLists.fileCount
+        dataYieldingFileCount = panelLists.dataYieldingFileCount
+
+        if panelLists.unreadableFiles:
+            for duffOne in panelLists.unreadableFiles:
                 logger.info(f"User set bibliographic file \"{duffOne}\" is unreadable")
-        if datalessFileList:
-            for duffOne in datalessFileList:
+        if panelLists.datalessFiles:
+            for duffOne in panelLists.datalessFiles:
                 logger.info(f"User set bibliographic file \"{duffOne}\" yielded no citation data")
 
-        # Process our dictionary of collected citations
-        # `- build display/insert lists
-        self.insert_list = []
-        self.display_list = []
-        if collect_parse_result:
+        # Process our collected citations
+        # `- display/insert lists
+        self.insert_list = panelLists.insertList
+        self.display_list = panelLists.displayList
+        self.location_list = panelLists.locationList
+        self.previewed = False
+        if self.insert_list:
 
             # Step 1 of 2: Some info/message generating
-            citationCount = len(collect_parse_result)
+            citationCount = len(self.insert_list)
             if dataYieldingFileCount < citeFileCount:
                 # one or more files yielded no data
                 msgShim = f"of {citeFileCount} "
@@ -112,14 +114,11 @@ class CiteFromBiblioFilesCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.
                          f"from {dataYieldingFileCount} {msgShim}"
                          f"user set filename{'s'[:citeFileCount^1]}")
 
-            # Step 2 of 2: Process the cit/ref data and display the quick panel
-            for cit, ref in collect_parse_result.items():
-                # insert the reSt citation reference in correct syntax
-                self.insert_list.append(f"[{cit}]_")
-                self.display_list.append(f"[{cit}] = {ref}")
+            # Step 2 of 2: display the quick panel
             sublime.active_window().show_quick_panel(
                 self.display_list, 
                 self.on_done,
+                on_highlight = self.on_highlight,
                 placeholder = placeholderInfo
             )
         else:
@@ -144,47 +143,69 @@ class InsertRstEpilogSubstitutionCommand(lnk_ioUtils.MessageOutputUtils, sublime
         else:
             self.view.run_command('insert', {"characters": self.insert_list[index]})
 
-    def get_rst_epilog_2part_replacement_dict(self, rst_epilog_str):
-        find_replacement_patterns = re.compile(r"""
-            ^\.\.\s+
-            \|(?P<short>.*)\|
-            \s+replace::\s+
-            (?P<long>.*)$
-            """, re.VERBOSE | re.MULTILINE)
-        return dict(re.findall(find_replacement_patterns, rst_epilog_str))
-
-    def get_rst_epilog_and_prolog(self):
-        subl_top_folder_path = self.view.window().extract_variables()["folder"]
-        confPyPath = os.path.join(subl_top_folder_path, 'conf.py')
-        if not os.access(confPyPath, os.R_OK):
+    def get_rst_epilog_and_prolog(self, wait=True):
+        # (None, None) if not waiting for a project context that is not ready yet, see getProjectContext
+        projContext = getProjectContext(self.view, wait)
+        if projContext is None:
             return (None, None)
-        else:
-            confPyVarsToGet = ["rst_epilog", "rst_prolog"]
-            return getPyFileVars(confPyPath, confPyVarsToGet)
+        return (projContext.getVar("rst_epilog"), projContext.getVar("rst_prolog"))
+
+    def get_substitution_sources(self, projContext):
+        """
+        Return (textSources, fileSources) for the substitution index (see loc_substIndex.substitutionIndex):
+        `- the rst_epilog/rst_prolog values of conf.py, and of any python files in rst_epilog_source_list,
+         - plus the other (reST/text) files in rst_epilog_source_list
+        """
+        textSources = []
+        fileSources = []
+        pySourcePaths = [projContext.confPyPath] if projContext.hasConfPy else []
+        for sourceFile in settings.getOne('rst_epilog_source_list') or []:
+            sourcePathStr = os.path.normpath(os.path.join(projContext.topFolderPath, sourceFile))
+            if not sourcePathStr.endswith('.py'):
+                fileSources.append(sourceFile)
+            elif sourcePathStr not in pySourcePaths:
+                pySourcePaths.append(sourcePathStr)
+        for pySourcePath in pySourcePaths:
+            if not os.access(pySourcePath, os.R_OK):
+                logger.info(f"User set rst_epilog source file \"{pySourcePath}\" is unreadable")
+                continue
+            # (the conf.py variables cache notices changes to any files the python file reads, e.g. an epilog .txt)
+            for substStr in getConfPyVars(pySourcePath, ['rst_epilog', 'rst_prolog']):
+                if isinstance(substStr, str):
+                    textSources.append((substStr, os.path.dirname(pySourcePath)))
+        return textSources, fileSources
 
     def is_enabled(self):
-        epilogPrologTuple = self.get_rst_epilog_and_prolog()
-        shouldEnable = not all(var is None for var in epilogPrologTuple)
+        epilogPrologTuple = self.get_rst_epilog_and_prolog(wait=False)
+        docPathStr = self.view.file_name()
+        shouldEnable = (not all(var is None for var in epilogPrologTuple)
+                        or bool(settings.getOne('rst_epilog_source_list'))
+                        or bool(docPathStr and substIndex.isDocumentIndexed(docPathStr)))
         if shouldEnable:
-            logger.debug(f'Enabling menu for {__class__} as rstEpilog and/or rstProlog contain data.')
+            logger.debug(f'Enabling menu for {__class__} as rstEpilog, rstProlog, rst_epilog_source_list '
+                         'and/or the document contain data.')
         else:
-            logger.debug(f'Disabling menu for {__class__} as rstEpilog and rstProlog contain no data.')
+            logger.debug(f'Disabling menu for {__class__} as rstEpilog, rstProlog, rst_epilog_source_list '
+                         'and the document contain no data.')
         return shouldEnable 
 
     def run(self, edit):
-        self.insert_list = []
-        self.display_list = []
-
-        epilogPrologTuple = self.get_rst_epilog_and_prolog()
-        for substStr in epilogPrologTuple:
-            if substStr is not None:
-                convertedRstEpilog = self.get_rst_epilog_2part_replacement_dict(substStr)
-                if convertedRstEpilog:
-                    for shorty, longy in convertedRstEpilog.items():
-                        self.insert_list.append("|{}|".format(shorty))
-                        self.display_list.append("|{}| = {}".format(shorty, longy))
-
-        parsing_status_msg = f"{len(self.display_list)} rst_[epi|pro]log replacements loaded from sphinx conf.py"
+        projContext = getProjectContext(self.view)
+        textSources, fileSources = self.get_substitution_sources(projContext)
+        # (the panel lists are shared with later runs, and must not be modified)
+        docPathStr = self.view.file_name()
+        if docPathStr:
+            # the project's substitutions, plus those local to this document (or the files it includes)
+            panelLists = substIndex.getDocumentPanelLists(docPathStr, projContext.topFolderPath, textSources, fileSources)
+        else:
+            panelLists = substIndex.getPanelLists(projContext.topFolderPath, textSources, fileSources)
+        self.insert_list = panelLists.insertList
+        self.display_list = panelLists.displayList
+
+        parsing_status_msg = f"{len(self.display_list)} substitutions loaded from sphinx conf.py"
+        sourceFileCount = len(panelLists.sourcePaths)
+        if sourceFileCount:
+            parsing_status_msg += f" and {sourceFileCount} source file{'s'[:sourceFileCount ^ 1]}"
         self.status_message(parsing_status_msg)
         logger.debug(parsing_status_msg)
 
@@ -225,13 +246,18 @@ class VisibleIfHaveConfPyAndRstContextCommand(lnk_ioUtils.MessageOutputUtils, su
             return True
         else:
             # Must check for a) extant 'conf.py', b) cursor in reSt context
-            subl_top_folder_path = self.view.window().extract_variables()["folder"]
+            # `- (without waiting for a conf.py that has to be run, the menu being hidden until it has been)
+            projContext = getProjectContext(self.view, wait=False)
+            if projContext is None:
+                logger.debug("Hiding top level context menu "
+                             "as the sphinx project context is being read")
+                return False
             # Check A: Does conf.py exist in a readable state?
-            if not os.access(os.path.join(subl_top_folder_path, 'conf.py'), os.R_OK):
+            elif not projContext.hasConfPy:
                 logger.debug("Hiding top level context menu "
                              "as conf.py absent from project root folder")
                 return False
-            elif not self.view.match_selector(self.view.sel()[0].begin(), "text.restructuredtext"):
+            elif not projContext.isRstContext(self.view):
                 logger.debug("Hiding top level context menu "
                              "as cursor not within \"text.restructuredtext\" scope")
                 return False
@@ -258,18 +284,21 @@ class VisibleIfIntersphinxChecksOkCommand(lnk_ioUtils.MessageOutputUtils, sublim
     targetMenuStr = "--placeholder--"
 
     def is_enabled(self, **kwargs):
-        # Construct the expected sphinx-doc project %root-folder%/conf.py file path
-        subl_top_folder_path = self.view.window().extract_variables()["folder"]
-        confPyPath = os.path.join(subl_top_folder_path, 'conf.py')
-        if not os.access(confPyPath, os.R_OK):
+        # The (memoised) sphinx-doc project context holds the %root-folder%/conf.py variables
+        # `- (the menu is disabled while a conf.py that has to be run is read, in the background)
+        projContext = getProjectContext(self.view, wait=False)
+        if projContext is None:
+            logger.debug(f"{self.targetMenuStr} menu disabled: the sphinx project context is being read")
+            return False
+        confPyPath = projContext.confPyPath
+        if not projContext.hasConfPy:
             logger.debug(f"{self.targetMenuStr} menu disabled: as conf.py absent from project root folder")
             return False
 
         logger.debug(f"Determining {self.targetMenuStr} visibility by checking for key variables in {confPyPath}")
-        # try to read two required variables from conf.py
-        confPyVarsToGet = ["intersphinx_mapping",
-            "html_baseurl"]
-        intersphinxMap, projBaseurl = getPyFileVars(confPyPath, confPyVarsToGet)
+        # check for two required variables from conf.py
+        intersphinxMap = projContext.getVar("intersphinx_mapping")
+        projBaseurl = projContext.getVar("html_baseurl")
         # check the two required variables
         if intersphinxMap is None:
             logger.debug(f'{self.targetMenuStr} menu disabled: No \"intersphinx_mapping\" variable in Sphinx project conf.py')
@@ -309,52 +338,49 @@ class InsertSphinxLinksCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.Te
             # noop; nothing was selected e.g. the user pressed escape
             return
         else:
-            self.view.run_command('insert', {"characters": self.datalist[index]})
+            self.view.run_command('insert', {"characters": self.linkList.insertStr(index)})
 
     def run(self, edit, withinProj=False, refTypeToGet='all'):
         # The refTypeToGet and withinProj vars must be set in the sublime command calls to this routine
+        # `- refTypeToGet is 'all', one of validRefTypesList, or any other 'domain:role' e.g. 'py:class'
         if refTypeToGet == 'all':
             refTypeTargetList = validRefTypesList
-        elif refTypeToGet in validRefTypesList:
+            # 'all' parses the complete inventory, after which every other variant is served without reparsing
+            storeEntryTypes = None
+        elif refTypeToEntryType(refTypeToGet) is not None:
             refTypeTargetList = [refTypeToGet]
+            storeEntryTypes = [refTypeToEntryType(refTypeToGet)]
         else:
             logger.error(f"Plugin config error. Incorrect [{refTypeToGet}] setting for refTypeToGet parameter")
             return
 
-        self.datalist = []
-        self.displaylist = []
+        invJobsInfo = self.get_inv_jobs(withinProj)
+        if invJobsInfo is None:
+            return
+        invJobs, projSelfKey = invJobsInfo
+        maxWorkers = settings.getOne('inventory_parse_workers')
+        # load the inventories off the UI thread, then show the quick panel back on the UI thread
+        sublime.set_timeout_async(lambda: self.load_and_show_links(invJobs, storeEntryTypes, refTypeTargetList,
+                                                                   projSelfKey, maxWorkers))
 
+    def get_inv_jobs(self, withinProj):
+        """
+        Work out which intersphinx projects (keys) to take links from, and where their objects.inv files are
+        return (invJobs, projSelfKey), invJobs being a list of (intersphinx key, objects.inv path) in intersphinx map order
+        `- or None (having told the user) if the current sphinx project has no intersphinx_mapping
+        """
         # Find some essential/useful variables from the associated sphinx project %root-folder%/conf.py file
-        self.subl_top_folder_path = self.view.window().extract_variables()["folder"]
-        confPyPath = os.path.join(self.subl_top_folder_path, 'conf.py')
-        confPyVarsToGet = ["intersphinx_mapping",
-            "html_baseurl",
-            "intersphinx_resolve_self"]
-        self.givenMap, projBaseurl, projResolveSelf = getPyFileVars(confPyPath, confPyVarsToGet)
-        projSelfKey = settings.get(['intersphinx_self_key'])['intersphinx_self_key']
-
-        # print(f"found intersphinx_mapping = {self.givenMap}")
-        # print(f"found html_baseurl = {projBaseurl}")
-        # print(f"found projResolveSelf = {projResolveSelf}")
-        # print(f"found projSelfKey = {projSelfKey}")
-        # return
-
+        projContext = getProjectContext(self.view)
+        self.subl_top_folder_path = projContext.topFolderPath
+        # (the conf.py values are shared by all commands, and must not be modified)
+        self.givenMap = projContext.getVar("intersphinx_mapping")
         if self.givenMap is None:
             self.error_message('No intersphinx_mapping variable in current sphinx project conf.py')
-            return
+            return None
 
         # identify key to local proj in intersphinx_mapping
-        if projSelfKey is None:
-            if projResolveSelf is not None:
-                projSelfKey = projResolveSelf
-            elif projBaseurl is not None:
-                projNetloc = urlsplit(projBaseurl).netloc
-                for isKey, isData in self.givenMap.items():
-                    if urlsplit(isData[0]).netloc == projNetloc:
-                        projSelfKey = isKey
-                        break
-        # print(f'calculated proj self key = {projSelfKey}')
-        # return
+        projSelfKey = projContext.resolveProjSelfKey(settings.getOne('intersphinx_self_key', window=self.view.window()))
+        logger.debug(f'Intersphinx map key of the current project = "{projSelfKey}"')
 
         # If a sphinx project is local/private, i.e. not publicly accessible on the internet
         # then we don't want links to this site to appear in public sphinx projects.
@@ -362,11 +388,16 @@ class InsertSphinxLinksCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.Te
         # allows the use of a 'priv-project-prefix' (definable via plugin settings).
         # SphinxRefmate will recognise private projects by this prefix, and will not
         # put links to private projects to be inserted in public projects.
-        priv_prefix = settings.get(['priv_project_prefix'])['priv_project_prefix']
+        priv_prefix = settings.getOne('priv_project_prefix', window=self.view.window())
         logger.debug(f"Settings yielded private/local project prefix = \"{priv_prefix}\" (for intersphinx map keys)")
 
         self.targetKeyList = []  # an empty self.targetKeyList list will get link data from all intersphinx map keys
         if withinProj:
+            if not projSelfKey:
+                self.error_message('Unable to identify the current project in intersphinx_mapping. '
+                                   'Set "html_baseurl" or "intersphinx_resolve_self" in conf.py, '
+                                   'or "intersphinx_self_key" in the project settings.')
+                return None
             # limit link data to current project intersphinx map key
             self.targetKeyList = [projSelfKey]
         elif priv_prefix and not projSelfKey.startswith(priv_prefix):
@@ -380,36 +411,266 @@ class InsertSphinxLinksCommand(lnk_ioUtils.MessageOutputUtils, sublime_plugin.Te
                     self.targetKeyList += [isKey]
         logger.debug(f"Compiling data for following intersphinx map keys: {self.targetKeyList} (all keys if list is empty)")
 
-        simpleMap = getThinIntersphinxMap(self.givenMap, self.subl_top_folder_path, self.targetKeyList)
-        # for thisKey, objInvPaths in self.normalise_map_dict().items():
-        for thisKey, objInvPaths in simpleMap.items():
-            for extantPath in objInvPaths:
-                logger.debug(f"Parsing {extantPath} (for sphinx project \"{thisKey}\" handle links)")
-                if thisKey == projSelfKey:
-                    curProj = True
-                    logger.debug(f'- Intersphinx:{thisKey} is the project currently being edited')
-                else:
-                    curProj = False
-                datal, displ = getObjInvDisplayLists(extantPath,
-                                                    refTypeTargetList=refTypeTargetList,
-                                                    intersphinx_key=thisKey,
-                                                    is_cur_proj=curProj)
-                self.datalist += datal
-                self.displaylist += displ
-                logger.debug(f'- Intersphinx:{thisKey} yielded {len(datal)} references of type: {refTypeTargetList}')
-
-        if not self.datalist:
+        invJobs = get_intersphinx_inv_jobs(self.givenMap, self.subl_top_folder_path, self.targetKeyList,
+                                           self.view.window())
+        return invJobs, projSelfKey
+
+    def load_and_show_links(self, invJobs, storeEntryTypes, refTypeTargetList, projSelfKey, maxWorkers):
+        # links are gathered as columns of the (shared, cached) parsed inventories
+        # `- the reSt text to insert is only formatted for the link the user finally picks
+        linkList = inventoryLinkList()
+        # inventories are loaded concurrently, but results come back (and are merged) in invJobs order
+        for thisKey, extantPath, invStore in loadObjInvStores(invJobs, storeEntryTypes, maxWorkers):
+            if invStore is None:
+                continue
+            if thisKey == projSelfKey:
+                curProj = True
+                logger.debug(f'- Intersphinx:{thisKey} is the project currently being edited')
+            else:
+                curProj = False
+            linkCount = 0
+            for refType in refTypeTargetList:
+                linkCount += linkList.addColumn(invStore, refTypeToEntryType(refType),
+                                                intersphinx_key=thisKey,
+                                                is_cur_proj=curProj)
+            logger.debug(f'- Intersphinx:{thisKey} yielded {linkCount} references of type: {refTypeTargetList}')
+
+        if not len(linkList):
             self.status_message("No valid intersphinx data found")
             logger.error(f'No {refTypeTargetList} entries found in any objects.inv '
                          'for all searched intersphinx map keys.')
             return
-        elif len(self.datalist) == len(self.displaylist):  # check display and data lists are same length
-            self.status_message(f"Displaying {len(self.datalist)} objects.inv entries")
-            logger.debug(f"Displaying {len(self.datalist)} objects.inv entries")
-            sublime.active_window().show_quick_panel(
-                self.displaylist, 
+        else:
+            self.linkList = linkList
+            displayStrs = linkList.displayStrs()
+            self.status_message(f"Displaying {len(linkList)} objects.inv entries")
+            logger.debug(f"Displaying {len(linkList)} objects.inv entries")
+            sublime.set_timeout(lambda: sublime.active_window().show_quick_panel(
+                displayStrs, 
                 self.on_done
-            )
+            ))
+
+
+class SearchSphinxLinksCommand(InsertSphinxLinksCommand):
+    """
+    Searches the objects.inv entries of the current, or all, intersphinx projects by name and display name
+    `- e.g. 'retry policy' finds every section, page, term (or any other domain:role entry) whose title contains
+     - words beginning 'retry' and 'policy'
+    The query is typed into the command palette, which previews the best few matches at each keystroke, and the
+    `- best matches (see inventory_search_max_results) are then offered for insertion (see the input handlers below)
+    The search runs against an on-disk index of all inventories (see loc_invIndex) which is kept up to date,
+    `- in the background, as inventories change. It does not load the inventories into memory, and each keystroke
+     - only fetches the top matches, so that it stays responsive for inventories of millions of links.
+    """
+    lastQuery = ""
+
+    def is_enabled(self, **kwargs):
+        return getInvSearchIndex() is not None
+
+    def input_description(self):
+        return "Search links"
+
+    def input(self, args):
+        # the query and link are asked for in the command palette, when not given in the command's args
+        # `- refTypeToGet is 'all' (every entry type of every domain), one of validRefTypesList, or any other 'domain:role'
+        refTypeToGet = args.get('refTypeToGet', 'all')
+        if refTypeToGet == 'all':
+            searchEntryTypes = None
+        elif refTypeToEntryType(refTypeToGet) is not None:
+            searchEntryTypes = [refTypeToEntryType(refTypeToGet)]
         else:
-            self.error_message('Data mismatch in retrieving [{}] entries from {}'.format(refTypeToGet, ObjInvPath))
+            logger.error(f"Plugin config error. Incorrect [{refTypeToGet}] setting for refTypeToGet parameter")
+            return None
+        searchIndex = getInvSearchIndex()
+        if searchIndex is None:
+            self.error_message('The intersphinx search index is unavailable (see the console for details)')
+            return None
+
+        invJobsInfo = self.get_inv_jobs(args.get('withinProj', False))
+        if invJobsInfo is None:
+            return None
+        invJobs, projSelfKey = invJobsInfo
+        linkSearch = inventoryLinkSearch(searchIndex, invJobs, searchEntryTypes, projSelfKey)
+        # bring the index up to date while the user types their query
+        linkSearch.startSync()
+        if 'query' in args:
+            return SphinxLinkInputHandler(linkSearch, args['query'])
+        return SphinxLinkQueryInputHandler(linkSearch)
+
+    def run(self, edit, query, link, withinProj=False, refTypeToGet='all'):
+        SearchSphinxLinksCommand.lastQuery = query
+        self.view.run_command('insert', {"characters": link})
+
+
+class SphinxLinkQueryInputHandler(sublime_plugin.TextInputHandler):
+    """
+    The query of the search_sphinx_links command: the best few matches are previewed as the query is typed
+    """
+    previewCount = 10
+
+    def __init__(self, linkSearch):
+        self.linkSearch = linkSearch
+
+    def name(self):
+        return 'query'
+
+    def placeholder(self):
+        return 'Words of a link title or name e.g. retry policy'
+
+    def initial_text(self):
+        return SearchSphinxLinksCommand.lastQuery
+
+    def validate(self, text):
+        return bool(text.strip())
+
+    def preview(self, text):
+        if not text.strip():
+            return None
+        insertStrs, displayStrs = self.linkSearch.search(text, self.previewCount)
+        lines = [html.escape(displayStr) for displayStr in displayStrs]
+        if not lines:
+            lines = [f'No intersphinx links found matching "{html.escape(text)}"']
+        if self.linkSearch.isSyncing():
+            lines.append('<i>(indexing intersphinx inventories, more links may follow)</i>')
+        return sublime.Html('<br>'.join(lines))
+
+    def next_input(self, args):
+        return SphinxLinkInputHandler(self.linkSearch, args['query'])
+
+
+class SphinxLinkInputHandler(sublime_plugin.ListInputHandler):
+    """
+    The link of the search_sphinx_links command: picked from the best matches of the query
+    """
+
+    def __init__(self, linkSearch, queryStr):
+        self.linkSearch = linkSearch
+        self.queryStr = queryStr
+
+    def name(self):
+        return 'link'
+
+    def placeholder(self):
+        return f'Best matches for "{self.queryStr}"'
+
+    def list_items(self):
+        insertStrs, displayStrs = self.linkSearch.search(self.queryStr, settings.getOne('inventory_search_max_results'))
+        if not insertStrs:
+            sublime.status_message(f"No intersphinx links found matching \"{self.queryStr}\"")
+        return list(zip(displayStrs, insertStrs))
+
+
+class SettingsSnapshotListener(sublime_plugin.EventListener):
+    """
+    Discards a window's resolved plugin settings snapshot (see pluginSettingsManager) when its project settings
+    `- may have changed. Changes to the user settings file are picked up by the settings manager itself.
+    """
+    def on_load_project(self, window):
+        settings.invalidate(window)
+
+    def on_post_save_project(self, window):
+        settings.invalidate(window)
+
+    def on_pre_close_window(self, window):
+        settings.invalidate(window)
+
+
+class ProjectRootListener(sublime_plugin.EventListener):
+    """
+    Keeps the sphinx project root index (see loc_projectContext.projectRoots) current: a saved conf.py
+    `- may have just been created, so its folder's cached 'no conf.py' entry is dropped straight away
+    """
+    def on_post_save(self, view):
+        fileName = view.file_name()
+        if fileName and os.path.basename(fileName) == 'conf.py':
+            projectRoots.invalidate(os.path.dirname(os.path.abspath(fileName)))
+
+    def on_close(self, view):
+        forgetView(view)
+
+
+class CacheWarmingListener(sublime_plugin.EventListener):
+    """
+    Warms the plugin's caches in the background, so the interactive commands find their data ready:
+    - when a restructuredtext view of a sphinx project is loaded or activated, the project's conf.py variables,
+      `- intersphinx inventories (parsed, and indexed for searching), citations and document-local
+       - substitution definitions are brought up to date
+     - (a project is warmed again after warmIntervalSeconds, or straight away if its conf.py, or a file its
+       `- values are derived from, has changed)
+    - when a conf.py, a reST file, an indexed bibliographic file or a warmed objects.inv is saved,
+      `- just that is rebuilt
+    """
+    warmIntervalSeconds = 300
+
+    def __init__(self):
+        self._warmed = {}          # project root folder: (projectContext warmed, time warmed)
+        self._warmedInvPaths = set()
+        self._lock = threading.Lock()
+
+    def on_load_async(self, view):
+        self.warm_project(view)
+
+    def on_activated_async(self, view):
+        self.warm_project(view)
+
+    def on_post_save_async(self, view):
+        fileName = view.file_name()
+        if not fileName:
+            return
+        realPathStr = os.path.realpath(fileName)
+        if realPathStr.endswith(substitutionSourceExtensions):
+            substIndex.refreshFile(realPathStr)
+        if os.path.basename(fileName) == 'conf.py':
+            # the project's context is rebuilt (conf.py has changed), and its inventories checked again
+            # `- the project being that of the conf.py's own folder (so the view's syntax is not checked)
+            projectRoots.invalidate(os.path.dirname(os.path.abspath(fileName)))
+            self.warm_context(getProjectContext(view), view.window(), force=True)
+        elif citeIndex.refreshFile(realPathStr):
+            logger.debug(f'Rescanned citations of saved file {realPathStr}')
+        elif realPathStr in self._warmedInvPaths:
+            logger.debug(f'Reloading saved objects.inv {realPathStr}')
+            getObjInvStore(realPathStr)
+            searchIndex = getInvSearchIndex()
+            if searchIndex is not None:
+                syncInvSearchIndex(searchIndex, [(None, realPathStr)])
+
+    def warm_project(self, view):
+        # warm the caches of the sphinx project of a reST view
+        if not view.file_name() or not view.match_selector(0, "text.restructuredtext"):
+            return
+        self.warm_context(getProjectContext(view), view.window())
+
+    def warm_context(self, projContext, window, force=False):
+        # warm the caches of a sphinx project in the background, using the plugin settings of 'window'
+        # `- (a context that is unchanged, and was warmed within warmIntervalSeconds, is skipped unless forced)
+        if not projContext.hasConfPy:
             return
+        now = time.monotonic()
+        with self._lock:
+            lastWarmed = self._warmed.get(projContext.topFolderPath)
+            if (not force and lastWarmed is not None and lastWarmed[0] is projContext
+                    and now - lastWarmed[1] < self.warmIntervalSeconds):
+                return
+            self._warmed[projContext.topFolderPath] = (projContext, now)
+        threading.Thread(target=self.warm_caches, args=(projContext, window),
+                         name=f'{pluginName}-cache-warming', daemon=True).start()
+
+    def warm_caches(self, projContext, window):
+        startTime = time.perf_counter()
+        citeFileList = settings.getOne('bib_ref_file_list', window=window)
+        if citeFileList:
+            citeIndex.getPanelLists(citeFileList, projContext.topFolderPath,
+                                    settings.getOne('citation_scan_workers', window=window))
+        substIndex.indexProject(projContext.topFolderPath)
+        givenMap = projContext.getVar("intersphinx_mapping")
+        if givenMap:
+            # complete stores are loaded, so every links command variant is then served without parsing
+            invJobs = get_intersphinx_inv_jobs(givenMap, projContext.topFolderPath, window=window)
+            loadObjInvStores(invJobs, None, settings.getOne('inventory_parse_workers', window=window))
+            with self._lock:
+                self._warmedInvPaths.update(objInvPathStr for thisKey, objInvPathStr in invJobs)
+            searchIndex = getInvSearchIndex()
+            if searchIndex is not None:
+                syncInvSearchIndex(searchIndex, invJobs)
+        logger.debug(f'Warmed caches for sphinx project {projContext.topFolderPath} '
+                     f'in {(time.perf_counter() - startTime) * 1000:.1f} ms')
@@ -1,6 +1,6 @@
 from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
 import sublime
-from typing import Union, Tuple
+from typing import Union
 
 # def removeUnwantedDictKeys(dTarget: dict, wantedKeys: Union[dict, list]) -> dict:
 #     if type(wantedKeys) is dict:
@@ -121,7 +121,6 @@ def checkListItemsWithinSchema(sublist: list, listSchema: list, allowDuplicates=
     return True, ""
 
 def intWithinRange(item, lowerInt, upperInt):
-    print(f'lower {lowerInt}, upper {upperInt}')
     if type(item) != int:
         return False, 'Must be an integer.'
     elif item not in range(lowerInt, upperInt + 1):
@@ -148,66 +147,89 @@ _advTestMap = {
     "isShellCmdType"            : isShellCmdType
 }
 
+def _compileCheck(check, inOrList=False):
+    """
+    Compile one check spec (see compileChecks) into a closure: value -> fail string ('' if the check passed)
+    """
+    if type(check) == list:
+        # check we pass one of the checks in a list (or logic)
+        orValidators = [_compileCheck(orCheck, inOrList=True) for orCheck in check]
+        def validateAny(value):
+            orFails = []
+            for orValidator in orValidators:
+                failStr = orValidator(value)
+                if not failStr:
+                    return ""
+                orFails.append(failStr)
+            return (', or '.join(orFails) + '.').capitalize() if orFails else ""
+        return validateAny
+    elif type(check) == tuple:
+        # a non-basic check, represented by a function name in the tuple[0] entry, and its further parameters
+        checkFunc = _advTestMap[check[0]]
+        params = check[1:]
+        def validateAdv(value):
+            passBool, errStr = checkFunc(value, *params)
+            return "" if passBool else errStr
+        return validateAdv
+    elif type(check) == str:
+        testFunc, failStr = _basicTestMap[check]
+        if inOrList:
+            failStr = failStr.strip('.')
+        def validateBasic(value):
+            return "" if testFunc(value) else failStr
+        return validateBasic
+    raise TypeError(f'Check specs must be str, tuple or list types, not: {check!r}')
+
+def compileChecks(checks: list):
+    """
+    Compile a list of check specs (for one dictionary entry) into a single validator closure,
+    `- which returns the list of fail strings for a value (empty if all checks pass)
+    A check spec is a _basicTestMap name, an (_advTestMap name, param, ...) tuple, or a list of these (or logic)
+    All lookups in the test maps happen here, once, so unknown check names raise KeyError at compile time
+    """
+    validators = [_compileCheck(check) for check in checks]
+    def validate(value):
+        failStrs = []
+        for validator in validators:
+            failStr = validator(value)
+            if failStr:
+                failStrs.append(failStr)
+        return failStrs
+    return validate
+
+class compiledDictChecker():
+    """
+    A dictionary checker compiled once from a check dict { key: [check spec, ...] } (see compileChecks)
+    `- which can then check any number of dictionaries, or just some of their keys, without reinterpreting the specs
+    """
+
+    def __init__(self, checkDict):
+        self.validators = {k: compileChecks(checks) for k, checks in checkDict.items()}
+
+    def check(self, targetDict, keys=None):
+        """
+        Check the values of targetDict (only those of 'keys' if given) and return a list of tuple based
+        `- errors [('key', 'valueError'), ...]
+        """
+        errList = []
+        for k in (targetDict if keys is None else keys):
+            validator = self.validators.get(k)
+            if validator is not None and k in targetDict:
+                errList += [(k, failStr) for failStr in validator(targetDict[k])]
+        return errList
+
 class dictContentsChecker():
     """
     A dictionary checker which utilises pre-defined test maps (pointing to test functions)
     `- to test the contents of dictionary entries.
+    (A single use compiledDictChecker, use compiledDictChecker directly to check dictionaries repeatedly)
     """
 
     def __init__(self, targetDict, checkDict):
         self.targetDict = targetDict
         self.checkDict = checkDict
-        self.targetDictErrors = []
-        # Perform checks for key values as specified in checkDict
-        for k, v in self.targetDict.items():
-            if k in self.checkDict:
-                for thisCheck in self.checkDict.get(k, []):  # can be multiple checks for one value
-                    print(f'testing {thisCheck}')
-                    if type(thisCheck) == list:  # check we pass one of the checks in a list (or logic)
-                        orFails = []
-                        onePassed = False
-                        for orCheck in thisCheck:
-                            if type(orCheck) == tuple:
-                                passed, errStr = self._functionTupleCheck(orCheck, self.targetDict[k])
-                                if not passed:
-                                    orFails.append(errStr)
-                                else:
-                                    onePassed = True
-                            elif type(orCheck) == str:
-                                if not _basicTestMap[orCheck][0](self.targetDict[k]):
-                                    orFails.append(_basicTestMap[orCheck][1].strip('.'))
-                                else:
-                                    onePassed = True
-                            else:
-                                print('Error: Only str or tuple types allowed.')
-                        if orFails and not onePassed:
-                            multiFailStr = ', or '.join(orFails) + '.'
-                            self.targetDictErrors.append((k, multiFailStr.capitalize()))
-                    elif type(thisCheck) == tuple:
-                        # we have a non-basic check, represented by a function name in the tuple[0] entry
-                        passed, errStr = self._functionTupleCheck(thisCheck, self.targetDict[k])
-                        if not passed:
-                            self.targetDictErrors.append((k, errStr))
-                    else:
-                        if not _basicTestMap[thisCheck][0](self.targetDict[k]):
-                            self.targetDictErrors.append((k, _basicTestMap[thisCheck][1]))
-
-
-
-    def _functionTupleCheck(self, funcTuple: Tuple, itemToTest):
-        """
-        The first tuple entry is str pointing to an _advTestMap function that will check 'itemToTest'.
-        The itemToTest will be passed as the first parameter to the retrieved function
-        Further tuple entries are an ordered list of further parameters to pass to the check function
-        Check functions must return 2x values: a) bool test result, b) fail string (empty if check passed)
-        """
-        if len(funcTuple) > 1:
-            paramsToForward = list(funcTuple[1:])
-        else:
-            paramsToForward = []
-        passBool, errStr = _advTestMap[funcTuple[0]](itemToTest, *paramsToForward)
-        return passBool, errStr
-        
+        self.targetDictErrors = compiledDictChecker(checkDict).check(targetDict)
+
     def isOK(self):
         return not bool(self.targetDictErrors)
 
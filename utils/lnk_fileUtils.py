@@ -0,0 +1,27 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+
+# Note: This module deliberately avoids importing 'sublime' so that it can be used/exercised outside of the plugin host
+
+
+def walkFiles(dirPathStr, recursive=True):
+    # yield the paths of the files in a folder (and its sub folders), skipping hidden files and folders
+    # `- symlinked folders are not followed, so a link loop can't make the walk endless
+    pendingDirs = [dirPathStr]
+    while pendingDirs:
+        try:
+            dirEntries = os.scandir(pendingDirs.pop())
+        except OSError:
+            continue
+        with dirEntries:
+            for entry in dirEntries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            pendingDirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                except OSError:
+                    pass
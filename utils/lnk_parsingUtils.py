@@ -1,11 +1,19 @@
 from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import sys
+import copy
+import pickle
+import hashlib
 import importlib.machinery
 import importlib.util
 import threading
+from types import MappingProxyType
 import logging
 import sublime
 from .lnk_ioUtils import exceptionDetails
-from .lnk_dictUtils import dictContentsChecker, mandatoryKeyChecker
+from .lnk_dictUtils import compiledDictChecker, mandatoryKeyChecker
+from .lnk_pyAstUtils import getPyFileVarsStatic, unknown
+from .lnk_runnerUtils import workerProcessError, workerStartError
 
 defaultPluginName = __package__.split('.')[0]
 
@@ -17,22 +25,24 @@ def get_user_plugin_settings(pluginName: str = defaultPluginName,
     pluginUserSettings = sublime.load_settings(pluginSettingsFileName).to_dict()
     return pluginUserSettings
 
-def get_project_plugin_settings(pluginName: str = defaultPluginName):
+def get_project_plugin_settings(pluginName: str = defaultPluginName, window=None):
     # return any current project settings under the 'pluginName' key (in the sublime-project file)
-    return sublime.active_window().active_view().settings().get(pluginName, {})
+    # `- of 'window' (the active window if None)
+    view = (window or sublime.active_window()).active_view()
+    return view.settings().get(pluginName, {}) if view is not None else {}
 
 def get_combo_plugin_settings(pluginName: str = defaultPluginName,
-                               pluginSettingsFileName: str = ""):
+                               pluginSettingsFileName: str = "", window=None):
     """
     return a dictionary with the plugin settings for "pluginName"
     """
     pluginUserSettings = get_user_plugin_settings(pluginName, pluginSettingsFileName)
-    cur_proj_plugin_overrides = get_project_plugin_settings(pluginName)
+    cur_proj_plugin_overrides = get_project_plugin_settings(pluginName, window)
     # combine setting dicts so any current project settings will override same name Default/User 
     # `- settings from the plugin's .sublime-settings files
     return dict(pluginUserSettings, **cur_proj_plugin_overrides)
 
-def getSettingsVars(varNames: list, plusMode=False, userSettings=True):
+def getSettingsVars(varNames: list, plusMode=False, userSettings=True, window=None):
     """
     Return a block (dictionary) of plugin settings values corresponding to varName settings
     The block of settings requested, should be one of three 'settingsVarProfiles'
@@ -40,17 +50,18 @@ def getSettingsVars(varNames: list, plusMode=False, userSettings=True):
     Profile B: Purely project defined settings (userSettings=False)
     Profile C: User settings allowing project settings extensions (plusMode=True, userSettings=True)
     Any settings values which can't be satisfactorily calculated, are returned with value set to None
+    Project settings are those of 'window' (the active window if None)
     """
     if not userSettings:
         # Type B settings vars requested (from project settings only)
-        retDict = {k: v for k, v in get_project_plugin_settings().items() if k in varNames}
+        retDict = {k: v for k, v in get_project_plugin_settings(window=window).items() if k in varNames}
     elif not plusMode:
         # Type A settings vars requested (from user settings with project settings overrides)
-        retDict = {k: v for k, v in get_combo_plugin_settings().items() if k in varNames}
+        retDict = {k: v for k, v in get_combo_plugin_settings(window=window).items() if k in varNames}
     else:
         # Type C settings vars requested (from user settings with project settings {}_plus extensions)
         allUserSettings = get_user_plugin_settings()
-        allProjectSettings = get_project_plugin_settings()
+        allProjectSettings = get_project_plugin_settings(window=window)
         plusMap = {k: k + '_plus' for k in varNames}
         retDict = {}
         for key, plusKey in plusMap.items():
@@ -99,14 +110,15 @@ def getSettingsVars(varNames: list, plusMode=False, userSettings=True):
 
 def getSettingsVarsByType(Atypes: list,
                           Btypes: list,
-                          Ctypes: list):
+                          Ctypes: list,
+                          window=None):
     retDict = {}
     if Atypes:
-        retDict = dict(retDict, **getSettingsVars(Atypes, plusMode=False, userSettings=True))
+        retDict = dict(retDict, **getSettingsVars(Atypes, plusMode=False, userSettings=True, window=window))
     if Btypes:
-        retDict = dict(retDict, **getSettingsVars(Btypes, userSettings=False))
+        retDict = dict(retDict, **getSettingsVars(Btypes, userSettings=False, window=window))
     if Ctypes:
-        retDict = dict(retDict, **getSettingsVars(Ctypes, plusMode=True, userSettings=True))
+        retDict = dict(retDict, **getSettingsVars(Ctypes, plusMode=True, userSettings=True, window=window))
     return retDict
 
 
@@ -114,10 +126,16 @@ class pluginSettingsManager:
     """
     Singleton class to manage plugin settings.
     - Loads settings schema dictionary on singleton initiation
-    - As part of the initiation, the schema is used to perform checks on both user and sublime project settings,
-      for the plugin. These checks can include flagging missing mandatory variables and also checking that
-      variables are defined with the correct type/format
+    - The schema's checks are compiled (once) into per-key validators, which are used to check both user and
+      sublime project settings for the plugin. These checks can include flagging missing mandatory variables
+      and also checking that variables are defined with the correct type/format
+      -- checks are run when a settings snapshot is built (not at import/startup), and then only for the
+      -- settings whose values have changed since they were last checked
     - Provides [get, getOne, getAll] methods for retrieving settings
+      -- these are answered from a resolved (user + project) snapshot of all the settings, one per window/project,
+      -- of the active window, or of the window given (e.g. by code running on a background thread)
+      -- which is only rebuilt after a change: sublime's add_on_change for the user settings, or a call to
+      -- 'invalidate' (e.g. from an EventListener's on_load_project/on_post_save_project) for project settings
     - All 'get{}' methods are guaranteed to return a value for the setting(s) requested
       -- if the setting is not defined in the settings file, then a default value
       -- as defined in the schema, will be used if available. If no default value
@@ -154,6 +172,10 @@ class pluginSettingsManager:
         self.userOrProjMands = [k for k,v in self.bigSchema.items() if not 'default' in v and not k in self.theBs]
         self.projMands = [k for k,v in self.bigSchema.items() if not 'default' in v and k in self.theBs]
         self.theDefaults = {k:v['default'] for k, v in self.bigSchema.items() if 'default' in v}
+        self._snapshots = {}  # (window id, project file name): (MappingProxyType of all settings, set keys)
+        self._snapshotsLock = threading.Lock()
+        sublime.load_settings(f"{defaultPluginName}.sublime-settings").add_on_change(
+            f"{defaultPluginName}-settings-snapshot", self.invalidate)
 
         # compile check dicts for user settings file and project settings (sublime-project) files
         # Process type A settings
@@ -169,24 +191,40 @@ class pluginSettingsManager:
                 self.userSettingsChecks[k] = self.bigSchema[k]['checks']
                 self.projSettingsChecks[k+'_plus'] = self.bigSchema[k]['checks']
 
-        userSettingsDict = get_user_plugin_settings()
-        dCheck = dictContentsChecker(userSettingsDict, self.userSettingsChecks)
-        print(f'User settings check OK?: {dCheck.isOK()}')
-        print(f'User settings errors: {dCheck.getErrorList()}')
-
-        projSettingsDict = get_project_plugin_settings()
-        dCheck = dictContentsChecker(projSettingsDict, self.projSettingsChecks)
-        print(f'Proj settings check OK?: {dCheck.isOK()}')
-        print(f'Proj settings errors: {dCheck.getErrorList()}')
+        self.userSettingsChecker = compiledDictChecker(self.userSettingsChecks)
+        self.projSettingsChecker = compiledDictChecker(self.projSettingsChecks)
+        self._checkedValues = {'user': {}, 'proj': {}}  # settings values as they were when last checked
+        self._checkLock = threading.Lock()
 
-        missingUserMands = mandatoryKeyChecker(get_combo_plugin_settings(), self.userOrProjMands)
-        missingProjMands = mandatoryKeyChecker(get_project_plugin_settings(), self.projMands)
+    def _checkChangedSettings(self, window=None):
+        """
+        Check any user/project settings whose values have changed since they were last checked
+        `- and report any errors in them, plus any missing mandatory settings
+        """
+        for sourceName, settingsDict, checker in (('user', get_user_plugin_settings(), self.userSettingsChecker),
+                                                  ('proj', get_project_plugin_settings(window=window),
+                                                   self.projSettingsChecker)):
+            with self._checkLock:
+                checkedValues = self._checkedValues[sourceName]
+                changedKeys = [k for k in checker.validators
+                               if k in settingsDict and (k not in checkedValues or checkedValues[k] != settingsDict[k])]
+                for k in [k for k in checkedValues if k not in settingsDict]:
+                    del checkedValues[k]
+                for k in changedKeys:
+                    checkedValues[k] = settingsDict[k]
+            if not changedKeys:
+                continue
+            errList = checker.check(settingsDict, changedKeys)
+            logger.debug(f'Checked {len(changedKeys)} changed {sourceName} settings')
+            for k, errStr in errList:
+                logger.error(f'Invalid {sourceName} setting "{k}": {errStr}')
 
-        # logger.info(f'user settings checks = {self.userSettingsChecks}')
-        # logger.info(f'proj settings checks = {self.projSettingsChecks}')
-        logger.info(f'missing user settings = {missingUserMands}')
-        logger.info(f'missing proj settings = {missingProjMands}')
-        # return self
+        missingUserMands = mandatoryKeyChecker(get_combo_plugin_settings(window=window), self.userOrProjMands)
+        missingProjMands = mandatoryKeyChecker(get_project_plugin_settings(window=window), self.projMands)
+        if missingUserMands:
+            logger.info(f'missing user settings = {missingUserMands}')
+        if missingProjMands:
+            logger.info(f'missing proj settings = {missingProjMands}')
 
     def addDefaults(self, inDict, varList, addNones=True):
         for varName in varList:
@@ -197,33 +235,221 @@ class pluginSettingsManager:
                     inDict[varName] = None
         return inDict
 
-    def get(self, varNames: list, addDefaults=True):
-        Atypes = []
-        Btypes = []
-        Ctypes = []
-        for var in varNames:
-            if var in self.theAs:
-                Atypes += [var]
-            elif var in self.theBs:
-                Btypes += [var]
-            elif var in self.theCs:
-                Ctypes += [var]
-        retDict = getSettingsVarsByType(Atypes, Btypes, Ctypes)
-        retDict = self.addDefaults(retDict, varNames)
-        return retDict
-
-    def getOne(self, varName: str, addDefaults=True):
-        return self.get([varName], addDefaults)[varName]
-
-    def getAll(self, addDefaults=True):
-        retDict = getSettingsVarsByType(self.theAs, self.theBs, self.theCs)
+    def invalidate(self, window=None):
+        """
+        Discard the settings snapshot(s) of 'window' (all windows if None), so they are rebuilt on next use
+        """
+        with self._snapshotsLock:
+            if window is None:
+                self._snapshots.clear()
+            else:
+                for snapshotKey in [k for k in self._snapshots if k[0] == window.id()]:
+                    del self._snapshots[snapshotKey]
+
+    def _snapshot(self, window=None):
+        # return (resolved settings, keys set by the user/project) for 'window' (the active window if None)
+        if window is None:
+            window = sublime.active_window()
+        snapshotKey = (window.id(), window.project_file_name()) if window is not None else (None, None)
+        snapshot = self._snapshots.get(snapshotKey)
+        if snapshot is None:
+            self._checkChangedSettings(window)
+            setDict = getSettingsVarsByType(self.theAs, self.theBs, self.theCs, window)
+            snapshot = (MappingProxyType(self.addDefaults(dict(setDict), self.bigSchema.keys())), frozenset(setDict))
+            with self._snapshotsLock:
+                self._snapshots[snapshotKey] = snapshot
+        return snapshot
+
+    def get(self, varNames: list, addDefaults=True, window=None):
+        values, setKeys = self._snapshot(window)
+        if addDefaults:
+            return {varName: values.get(varName) for varName in varNames}
+        return {varName: values[varName] for varName in varNames if varName in setKeys}
+
+    def getOne(self, varName: str, addDefaults=True, window=None):
+        values, setKeys = self._snapshot(window)
+        if addDefaults or varName in setKeys:
+            return values.get(varName)
+        return None
+
+    def getAll(self, addDefaults=True, window=None):
+        values, setKeys = self._snapshot(window)
         if addDefaults:
-            for k, v in self.theDefaults.items():
-                if not k in retDict:
-                    retDict[k] = v
-        return retDict
+            return dict(values)
+        return {k: v for k, v in values.items() if k in setKeys}
+
+# Bump pyVarsCacheFormatVersion whenever the cache record format (or its meaning) changes
+pyVarsCacheFormatVersion = 1
 
-def getPyFileVars(pyFilePathStr: str, varNames: list):
+
+class pyFileVarsCache:
+    """
+    A cache of the variables extracted from python sourcefiles (e.g. conf.py) by getPyFileVars, shared by every command
+    - An entry holds the values of the variables requested so far, and the files they were derived from:
+      the sourcefile itself plus, if it had to be run, the project-local modules it imported (recorded during the run)
+      `- and, when run in a worker process, the project-local files it read (e.g. an rst_epilog kept in a .txt file)
+    - An entry is valid while all of those files keep the same mtime and size
+    - Entries are held in memory and pickled under Sublime's cache folder, so they survive plugin reloads and restarts
+    - Callers are given copies of the cached values, so they may modify them freely
+    """
+
+    def __init__(self, pluginName: str = defaultPluginName):
+        self.pluginName = pluginName
+        self._entries = {}  # realPathStr: {'deps': {pathStr: (mtime_ns, size)}, 'vars': {varName: value}}
+        self._lock = threading.Lock()
+
+    def _recordPath(self, realPathStr):
+        pathHash = hashlib.sha1(realPathStr.encode('utf-8')).hexdigest()
+        return os.path.join(sublime.cache_path(), self.pluginName, 'py_file_vars',
+                            f'{pathHash}.v{pyVarsCacheFormatVersion}.pickle')
+
+    @staticmethod
+    def statDeps(depPaths):
+        # return { pathStr: (mtime_ns, size) } for a list of files, or None if any can no longer be found
+        deps = {}
+        for pathStr in depPaths:
+            try:
+                fileStat = os.stat(pathStr)
+            except OSError:
+                return None
+            deps[pathStr] = (fileStat.st_mtime_ns, fileStat.st_size)
+        return deps
+
+    def _isValid(self, entry):
+        return entry is not None and self.statDeps(entry['deps']) == entry['deps']
+
+    def get(self, realPathStr: str, varNames: list):
+        # return a tuple of (copies of) the cached values of varNames, or None if any are not cached/valid
+        with self._lock:
+            entry = self._entries.get(realPathStr)
+        if entry is None:
+            entry = self._readRecord(realPathStr)
+            if entry is not None:
+                with self._lock:
+                    self._entries[realPathStr] = entry
+        if not self._isValid(entry) or not all(varName in entry['vars'] for varName in varNames):
+            return None
+        try:
+            return copy.deepcopy(tuple(entry['vars'][varName] for varName in varNames))
+        except Exception:
+            return None
+
+    def getDeps(self, realPathStr: str):
+        # return (a copy of) { pathStr: (mtime_ns, size) } for the files a valid entry was derived from, else {}
+        with self._lock:
+            entry = self._entries.get(realPathStr)
+        return dict(entry['deps']) if self._isValid(entry) else {}
+
+    def put(self, realPathStr: str, depPaths: list, varsDict: dict):
+        deps = self.statDeps(depPaths)
+        if deps is None:
+            return
+        with self._lock:
+            entry = self._entries.get(realPathStr)
+            if entry is not None and entry['deps'] == deps:
+                # same file versions, so just add the newly requested variables
+                entry = {'deps': deps, 'vars': dict(entry['vars'], **varsDict)}
+            else:
+                entry = {'deps': deps, 'vars': dict(varsDict)}
+            self._entries[realPathStr] = entry
+        self._writeRecord(realPathStr, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _readRecord(self, realPathStr):
+        try:
+            with open(self._recordPath(realPathStr), 'rb') as f:
+                record = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.debug(f'Ignoring unreadable cache record for {realPathStr}: {exceptionDetails(err)}')
+            return None
+        if (not isinstance(record, dict)
+                or record.get('version') != pyVarsCacheFormatVersion
+                or record.get('path') != realPathStr):
+            return None
+        return {'deps': record['deps'], 'vars': record['vars']}
+
+    def _writeRecord(self, realPathStr, entry):
+        # values which can't be pickled (possible when the sourcefile was run) are simply not persisted
+        try:
+            recordPathStr = self._recordPath(realPathStr)
+            os.makedirs(os.path.dirname(recordPathStr), exist_ok=True)
+            data = pickle.dumps({'version': pyVarsCacheFormatVersion, 'path': realPathStr, **entry},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+            tmpPathStr = f'{recordPathStr}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmpPathStr, 'wb') as f:
+                f.write(data)
+            os.replace(tmpPathStr, recordPathStr)
+        except Exception as err:
+            logger.debug(f'Unable to persist the cached variables of {realPathStr}: {exceptionDetails(err)}')
+
+
+pyVarsCache = pyFileVarsCache()
+
+
+def getPyFileVarsWithoutRunning(pyFilePathStr: str, varNames: list):
+    """
+    Return a tuple with the values of varNames in a python sourcefile, if they are cached (see pyVarsCache)
+    `- or can be determined statically, or None if the sourcefile would have to be run (see getPyFileVars)
+    """
+    realPathStr = os.path.realpath(pyFilePathStr)
+    cachedVars = pyVarsCache.get(realPathStr, varNames)
+    if cachedVars is not None:
+        return cachedVars
+    try:
+        staticVars = getPyFileVarsStatic(realPathStr, varNames)
+    except Exception as err:
+        logger.debug(f'Unable to extract {varNames} statically from {pyFilePathStr}: {exceptionDetails(err)}')
+        return None
+    unknownVarNames = [varName for varName, value in zip(varNames, staticVars) if value is unknown]
+    if unknownVarNames:
+        logger.debug(f'{unknownVarNames} of {pyFilePathStr} cannot be determined statically')
+        return None
+    pyVarsCache.put(realPathStr, [realPathStr], dict(zip(varNames, staticVars)))
+    return pyVarsCache.get(realPathStr, varNames) or staticVars
+
+
+def getPyFileVars(pyFilePathStr: str, varNames: list, worker=None):
+    """
+    Extract a list of varnames from a python sourcefile/module (set value to 'None' for non-existent varnames)
+    Return a tuple with the variables requested.
+    Results are served from pyVarsCache while the sourcefile (and any local modules it imports) are unchanged.
+    Otherwise the values are first determined statically, from the source code's syntax tree, without running it
+    `- (see lnk_pyAstUtils). This serves the literal/concatenated/f-string assignments typical of config files.
+    Only if a value cannot be determined statically is the sourcefile run: in the given worker process
+    `- (a lnk_runnerUtils.pyFileVarsWorker) if there is one, otherwise in process (see getPyFileVarsByImport)
+     - if the worker can't be started the sourcefile is run in process, but not if it fails or times out
+    Set all variable values to 'None' if major error occurs e.g. source file not readable
+    Warning: This function may run/import the code in pyFilePathStr
+           : Ensure that you trust any file you pass to this function
+    """
+    realPathStr = os.path.realpath(pyFilePathStr)
+    knownVars = getPyFileVarsWithoutRunning(realPathStr, varNames)
+    if knownVars is not None:
+        return knownVars
+    importedVars, depPaths = None, None
+    if worker is not None:
+        try:
+            importedVars, depPaths = worker.getVars(realPathStr, varNames)
+        except workerStartError as err:
+            logger.info(f'{err}. Running {pyFilePathStr} in process instead.')
+        except workerProcessError as err:
+            logger.error(f'Unable to run {pyFilePathStr} in a worker process. {err}')
+            return (None,) * len(varNames)
+        except RuntimeError as err:
+            logger.error(f'Error running {pyFilePathStr}:\n{err}')
+            return (None,) * len(varNames)
+    if importedVars is None:
+        importedVars, depPaths = _importPyFileVars(realPathStr, varNames)
+    if depPaths is not None:
+        pyVarsCache.put(realPathStr, depPaths, dict(zip(varNames, importedVars)))
+    return importedVars
+
+def getPyFileVarsByImport(pyFilePathStr: str, varNames: list):
     """
     Dynamically + temporarily import a python sourcefile/module.
     Extract a list of varnames from the temp module (set value to 'None' for non-existent varnames)
@@ -232,9 +458,29 @@ def getPyFileVars(pyFilePathStr: str, varNames: list):
     Set all variable values to 'None' if major error occurs e.g. source file not readable
     Warning: This function will run/import the code in pyFilePathStr
            : Ensure that you trust any file you pass to this function
-           : Consider parsing untrusted source code differently, e.g. with python's 'ast' module
-           : `- if you wish to extract data from potentially unsafe code
     """
+    return _importPyFileVars(pyFilePathStr, varNames)[0]
+
+def isProjectLocalFile(pathStr: str) -> bool:
+    """
+    True if pathStr is not part of python (stdlib), an installed (site-packages) distribution, or a sublime package
+    """
+    realPathStr = os.path.realpath(pathStr)
+    pathParts = realPathStr.split(os.sep)
+    if 'site-packages' in pathParts or 'dist-packages' in pathParts:
+        return False
+    nonLocalDirs = {sys.prefix, sys.base_prefix, sys.exec_prefix, os.path.dirname(os.__file__),
+                    sublime.packages_path(), sublime.installed_packages_path(), os.path.dirname(sublime.executable_path())}
+    return not any(realPathStr.startswith(os.path.join(os.path.realpath(d), '')) for d in nonLocalDirs if d)
+
+def _importPyFileVars(pyFilePathStr: str, varNames: list):
+    """
+    Import (run) pyFilePathStr and return (tuple of varNames values, dependency paths), see getPyFileVarsByImport
+    The dependency paths are pyFilePathStr plus the project-local modules first imported while running it;
+    `- these are removed from sys.modules again, so that edits to them take effect on the next run
+    Dependency paths are None if the import failed
+    """
+    modulesBefore = set(sys.modules)
     try:
         loader = importlib.machinery.SourceFileLoader( 'temp_py_mod', pyFilePathStr )
         spec = importlib.util.spec_from_loader( 'temp_py_mod', loader )
@@ -242,9 +488,15 @@ def getPyFileVars(pyFilePathStr: str, varNames: list):
         loader.exec_module( temp_py_mod )
     except Exception as err:
         logger.error(f'{exceptionDetails(err)}')
-        return (None,) * len(varNames)
+        return (None,) * len(varNames), None
     else:
         resList = []
         for varName in varNames:
             resList.append(getattr(temp_py_mod, varName, None))
-        return tuple(resList)
+        depPaths = [os.path.realpath(pyFilePathStr)]
+        for moduleName in set(sys.modules) - modulesBefore:
+            moduleFile = getattr(sys.modules[moduleName], '__file__', None)
+            if moduleFile and isProjectLocalFile(moduleFile):
+                depPaths.append(os.path.realpath(moduleFile))
+                sys.modules.pop(moduleName, None)
+        return tuple(resList), depPaths
@@ -0,0 +1,364 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import ast
+import copy
+
+# Note: This module deliberately avoids importing 'sublime' so that it can be used/exercised outside of the plugin host
+
+
+class _unknownValue:
+    """
+    The type of 'unknown': the value of a variable which cannot be determined without running the code
+    """
+    def __repr__(self):
+        return 'unknown'
+
+
+unknown = _unknownValue()
+
+# calls which let a module (re)bind its variables in ways that cannot be followed statically
+_dynamicNamespaceCalls = {'exec', 'eval', 'globals', 'vars', 'locals', 'setattr', '__import__', 'execfile'}
+
+# in-place methods of (already known) dict/list values which are followed statically
+_followedMutators = {'update', 'append', 'extend', 'insert', 'setdefault'}
+
+# builtins, and str methods, whose calls are evaluated statically (see _evalCall) and don't change their arguments
+_followedBuiltins = {'dict', 'tuple', 'list', 'str'}
+_followedStrMethods = {'format', 'join', 'strip', 'rstrip', 'lstrip'}
+
+_binOps = {
+    ast.Add: lambda a, b: a + b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Mod: lambda a, b: a % b,
+}
+
+
+def _isImmutable(value):
+    # True if value (e.g. a str, number, or tuple of them) can't be changed in place
+    if isinstance(value, (str, bytes, int, float, complex, bool, type(None))):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_isImmutable(item) for item in value)
+    return False
+
+
+class _notStatic(Exception):
+    # raised (and caught) internally when an expression cannot be evaluated without running the code
+    pass
+
+
+class staticPyVarsEvaluator:
+    """
+    Determine the values of module level variables of python source code, without running the code.
+    The module's top level statements are followed in order, evaluating the literal forms that config
+    `- files (e.g. sphinx conf.py) use to build their settings:
+     - literals, tuples/lists/sets/dicts (including ** unpacking), names bound earlier in the module
+     - '+', '*' and '%' between known values, f-strings, str.format, and dict()/tuple()/list() calls
+     - subscripts of known values, subscript assignment, '+=', and dict/list update/append/extend methods
+    Anything else (imports, function calls, attributes...) makes the variables it touches 'unknown', as do
+    `- assignments inside if/for/try/with/def blocks (which may or may not run), and passing a variable to a
+     - function call (e.g. add_maps(intersphinx_mapping)) as the function may change it.
+    Calling a function defined in the module makes every variable with a mutable (e.g. dict/list) value
+    `- 'unknown', as the function may change them in place.
+    A module that can rebind its variables dynamically (exec, globals(), 'import *', 'global' ...) yields
+    `- 'unknown' for every variable not assigned statically after that point.
+    """
+
+    def __init__(self, sourceStr: str, filenameStr: str = '<unknown>'):
+        self.tree = ast.parse(sourceStr, filenameStr)
+        self.names = {}
+        self.moduleFunctions = set()  # the names bound to functions defined in the module
+        self.dynamic = False
+        for node in self.tree.body:
+            self._execStatement(node)
+
+    def getVar(self, varName: str):
+        # return the value of varName, None if the module never assigns it, or 'unknown'
+        if varName in self.names:
+            return self.names[varName]
+        return unknown if self.dynamic else None
+
+    # --- statements ---
+
+    def _execStatement(self, node):
+        dynamicUse = self._hasDynamicNamespaceUse(node) or (
+            isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names))
+        callsModuleFunction = any(isinstance(subNode, ast.Call) and isinstance(subNode.func, ast.Name)
+                                  and subNode.func.id in self.moduleFunctions
+                                  for subNode in self._moduleLevelNodes(node))
+        if isinstance(node, ast.Assign):
+            value = self._evalOrUnknown(node.value)
+            for target in node.targets:
+                self._assign(target, value)
+        elif isinstance(node, ast.AnnAssign):
+            if node.value is not None:
+                self._assign(node.target, self._evalOrUnknown(node.value))
+        elif isinstance(node, ast.AugAssign):
+            self._augAssign(node)
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            self._mutatorCall(node.value)
+        elif isinstance(node, (ast.Expr, ast.Pass)):
+            pass
+        else:
+            # imports, defs, compound statements: whatever they bind is unknown
+            for boundName in self._boundNames(node):
+                self.names[boundName] = unknown
+                self.moduleFunctions.discard(boundName)
+            self.moduleFunctions.update(subNode.name for subNode in self._moduleLevelNodes(node)
+                                        if isinstance(subNode, (ast.FunctionDef, ast.AsyncFunctionDef)))
+        for argName in self._callArgNames(node):
+            if argName in self.names:
+                self.names[argName] = unknown
+        if dynamicUse:
+            # any variable may have been rebound
+            self.dynamic = True
+            for varName in self.names:
+                self.names[varName] = unknown
+        elif callsModuleFunction:
+            # a module's function may change any of its (mutable) variables in place
+            for varName, value in self.names.items():
+                if not _isImmutable(value):
+                    self.names[varName] = unknown
+
+    def _assign(self, target, value):
+        if isinstance(target, ast.Name):
+            self.names[target.id] = value
+            self.moduleFunctions.discard(target.id)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            values = None
+            if value is not unknown and not any(isinstance(elt, ast.Starred) for elt in target.elts):
+                try:
+                    values = list(value)
+                except TypeError:
+                    values = None
+                if values is not None and len(values) != len(target.elts):
+                    values = None
+            for i, elt in enumerate(target.elts):
+                self._assign(elt.value if isinstance(elt, ast.Starred) else elt,
+                             unknown if values is None else values[i])
+        elif isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name):
+            varName = target.value.id
+            container = self.names.get(varName, unknown)
+            try:
+                if container is unknown or value is unknown:
+                    raise _notStatic()
+                container[self._eval(self._subscriptIndex(target))] = value
+            except Exception:
+                self.names[varName] = unknown
+        else:
+            for boundName in self._targetNames(target):
+                self.names[boundName] = unknown
+
+    def _augAssign(self, node):
+        if not isinstance(node.target, ast.Name):
+            for boundName in self._targetNames(node.target):
+                self.names[boundName] = unknown
+            return
+        varName = node.target.id
+        try:
+            current = self.names.get(varName, unknown)
+            if current is unknown or type(node.op) not in _binOps:
+                raise _notStatic()
+            self.names[varName] = _binOps[type(node.op)](current, self._eval(node.value))
+        except Exception:
+            self.names[varName] = unknown
+
+    def _mutatorCall(self, call):
+        # e.g. intersphinx_mapping.update({...}) or extensions.append('...')
+        func = call.func
+        if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)):
+            return
+        varName = func.value.id
+        if varName not in self.names:
+            return
+        try:
+            target = self.names[varName]
+            if target is unknown or func.attr not in _followedMutators or not isinstance(target, (dict, list)):
+                raise _notStatic()
+            args, kwargs = self._evalCallArgs(call)
+            getattr(target, func.attr)(*args, **kwargs)
+        except Exception:
+            # a method we can't follow may have changed the value
+            self.names[varName] = unknown
+
+    def _hasDynamicNamespaceUse(self, node):
+        for subNode in ast.walk(node):
+            if (isinstance(subNode, ast.Call) and isinstance(subNode.func, ast.Name)
+                    and subNode.func.id in _dynamicNamespaceCalls):
+                return True
+            if isinstance(subNode, ast.Global):
+                return True
+        return False
+
+    @staticmethod
+    def _moduleLevelNodes(node):
+        # yield the nodes of a statement that run when it does i.e. not those within function/lambda bodies
+        # `- (a function definition itself is yielded)
+        pendingNodes = [node]
+        while pendingNodes:
+            subNode = pendingNodes.pop()
+            yield subNode
+            if not isinstance(subNode, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                pendingNodes.extend(ast.iter_child_nodes(subNode))
+
+    def _callArgNames(self, node):
+        # the names passed (whole, or in part e.g. name['key']) to the calls a statement runs, other than those
+        # `- followed statically, as the called code may change them in place
+        argNames = set()
+        for subNode in self._moduleLevelNodes(node):
+            if not isinstance(subNode, ast.Call):
+                continue
+            func = subNode.func
+            if isinstance(func, ast.Name) and func.id in _followedBuiltins and func.id not in self.names:
+                continue
+            if isinstance(func, ast.Attribute) and func.attr in _followedMutators | _followedStrMethods:
+                continue
+            for argNode in subNode.args + [keyword.value for keyword in subNode.keywords]:
+                argNames |= self._targetNames(argNode)
+        return argNames
+
+    def _boundNames(self, node):
+        # every name bound anywhere within a statement (but not within nested function/class scopes)
+        boundNames = set()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return {node.name}
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            return {(alias.asname or alias.name).split('.')[0] for alias in node.names}
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.stmt):
+                boundNames |= self._boundNames(child)
+            elif isinstance(child, ast.excepthandler) and child.name:
+                boundNames.add(child.name)
+                for stmt in child.body:
+                    boundNames |= self._boundNames(stmt)
+            elif isinstance(child, ast.withitem) and child.optional_vars is not None:
+                boundNames |= self._targetNames(child.optional_vars)
+        for attr in ('targets', 'target'):
+            targets = getattr(node, attr, None)
+            if targets is None:
+                continue
+            for target in targets if isinstance(targets, list) else [targets]:
+                boundNames |= self._targetNames(target)
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            func = node.value.func
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+                boundNames.add(func.value.id)
+        for subNode in ast.walk(node):
+            if isinstance(subNode, ast.NamedExpr) and isinstance(subNode.target, ast.Name):
+                boundNames.add(subNode.target.id)
+        return boundNames
+
+    def _targetNames(self, target):
+        # the module level names bound or changed by an assignment target
+        if isinstance(target, ast.Name):
+            return {target.id}
+        if isinstance(target, (ast.Tuple, ast.List)):
+            return set().union(*[self._targetNames(elt) for elt in target.elts])
+        if isinstance(target, ast.Starred):
+            return self._targetNames(target.value)
+        if isinstance(target, (ast.Subscript, ast.Attribute)):
+            return self._targetNames(target.value)
+        return set()
+
+    # --- expressions ---
+
+    def _evalOrUnknown(self, node):
+        try:
+            # values are copied so that a later in-place change to one name can't change another
+            return copy.deepcopy(self._eval(node))
+        except Exception:
+            return unknown
+
+    def _eval(self, node):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            value = self.getVar(node.id)
+            if value is unknown or node.id not in self.names:
+                raise _notStatic()
+            return value
+        if isinstance(node, ast.Tuple):
+            return tuple(self._evalElements(node.elts))
+        if isinstance(node, ast.List):
+            return self._evalElements(node.elts)
+        if isinstance(node, ast.Set):
+            return set(self._evalElements(node.elts))
+        if isinstance(node, ast.Dict):
+            result = {}
+            for keyNode, valueNode in zip(node.keys, node.values):
+                if keyNode is None:
+                    # {**other}
+                    result.update(self._eval(valueNode))
+                else:
+                    result[self._eval(keyNode)] = self._eval(valueNode)
+            return result
+        if isinstance(node, ast.BinOp) and type(node.op) in _binOps:
+            return _binOps[type(node.op)](self._eval(node.left), self._eval(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self._eval(node.operand)
+        if isinstance(node, ast.JoinedStr):
+            return ''.join(self._eval(part) for part in node.values)
+        if isinstance(node, ast.FormattedValue):
+            value = self._eval(node.value)
+            if node.conversion == ord('r'):
+                value = repr(value)
+            elif node.conversion == ord('s'):
+                value = str(value)
+            elif node.conversion == ord('a'):
+                value = ascii(value)
+            return format(value, self._eval(node.format_spec) if node.format_spec is not None else '')
+        if isinstance(node, ast.Subscript):
+            return self._eval(node.value)[self._eval(self._subscriptIndex(node))]
+        if isinstance(node, ast.Call):
+            return self._evalCall(node)
+        raise _notStatic()
+
+    def _subscriptIndex(self, node):
+        # python 3.8 wraps a subscript in ast.Index, later pythons don't
+        index = node.slice
+        if isinstance(index, ast.Slice):
+            raise _notStatic()
+        return getattr(index, 'value', index) if type(index).__name__ == 'Index' else index
+
+    def _evalElements(self, elts):
+        result = []
+        for elt in elts:
+            if isinstance(elt, ast.Starred):
+                result.extend(self._eval(elt.value))
+            else:
+                result.append(self._eval(elt))
+        return result
+
+    def _evalCallArgs(self, call):
+        args = self._evalElements(call.args)
+        kwargs = {}
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                kwargs.update(self._eval(keyword.value))
+            else:
+                kwargs[keyword.arg] = self._eval(keyword.value)
+        return args, kwargs
+
+    def _evalCall(self, call):
+        func = call.func
+        if isinstance(func, ast.Name) and func.id in _followedBuiltins and func.id not in self.names:
+            args, kwargs = self._evalCallArgs(call)
+            return {'dict': dict, 'tuple': tuple, 'list': list, 'str': str}[func.id](*args, **kwargs)
+        if isinstance(func, ast.Attribute) and func.attr in _followedStrMethods:
+            target = self._eval(func.value)
+            if isinstance(target, str):
+                args, kwargs = self._evalCallArgs(call)
+                return getattr(target, func.attr)(*args, **kwargs)
+        raise _notStatic()
+
+
+def getPyFileVarsStatic(pyFilePathStr: str, varNames: list) -> tuple:
+    """
+    Determine the values of a list of module level varNames in a python sourcefile, without running it
+    Return a tuple of values: None for a variable the file never assigns, 'unknown' for one whose
+    `- value can only be determined by running the file (see staticPyVarsEvaluator)
+    Raises OSError/SyntaxError/ValueError if the file cannot be read or parsed
+    """
+    with open(pyFilePathStr, 'r', encoding='utf-8') as f:
+        sourceStr = f.read()
+    evaluator = staticPyVarsEvaluator(sourceStr, pyFilePathStr)
+    return tuple(evaluator.getVar(varName) for varName in varNames)
@@ -0,0 +1,122 @@
+# Note: This module is the source code of a standalone worker process (see lnk_runnerUtils.pyFileVarsWorker)
+# `- it is run by a separate python interpreter (python -c <this source> <memory limit MB>) so it must not
+#  - import anything from the plugin (or sublime), and must remain compatible with any python 3 version
+import io
+import os
+import sys
+import json
+import builtins
+import traceback
+import importlib.util
+import importlib.machinery
+
+# protocol: one JSON object per line
+# request  = {"path": "/abs/path/conf.py", "vars": ["var1", "var2"]}
+# response = {"ok": true, "vars": {"var1": <encoded value>}, "unencodable": ["var2"], "deps": ["/abs/mod.py"]}
+#          | {"ok": false, "error": "<traceback>", "deps": [...]}
+
+
+def encodeValue(value):
+    # JSON can't distinguish tuples/lists, or hold sets/non-str dict keys, so containers are tagged
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [encodeValue(v) for v in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [encodeValue(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [encodeValue(v) for v in value]}
+    if isinstance(value, dict):
+        return {'__dict__': [[encodeValue(k), encodeValue(v)] for k, v in value.items()]}
+    raise TypeError(f'{type(value).__name__} values cannot be returned')
+
+
+def isProjectLocalFile(pathStr):
+    # True if pathStr is not part of python (stdlib) or an installed (site-packages) distribution
+    realPathStr = os.path.realpath(pathStr)
+    pathParts = realPathStr.split(os.sep)
+    if 'site-packages' in pathParts or 'dist-packages' in pathParts:
+        return False
+    nonLocalDirs = {sys.prefix, sys.base_prefix, sys.exec_prefix, os.path.dirname(os.__file__)}
+    return not any(realPathStr.startswith(os.path.join(os.path.realpath(d), '')) for d in nonLocalDirs if d)
+
+
+def evaluate(pathStr, varNames):
+    """
+    Run the python file at pathStr (with its folder as the current directory, as sphinx does) and return
+    `- the response for the values of varNames. sys.path, the current directory and any project-local modules
+     - imported by the run are restored/removed afterwards; installed modules stay imported for later runs
+    The project-local modules imported, and files read (e.g. an rst_epilog read from a .txt file), are returned
+    `- as dependencies of the values
+    """
+    modulesBefore = set(sys.modules)
+    pathBefore = list(sys.path)
+    cwdBefore = os.getcwd()
+    depPaths = [os.path.realpath(pathStr)]
+    readPaths = []
+    realOpen = io.open
+
+    def recordingOpen(file, mode='r', *args, **kwargs):
+        if isinstance(file, (str, bytes, os.PathLike)) and not any(c in mode for c in 'wax+'):
+            readPaths.append(os.path.abspath(os.fsdecode(file)))
+        return realOpen(file, mode, *args, **kwargs)
+
+    try:
+        builtins.open = io.open = recordingOpen
+        os.chdir(os.path.dirname(pathStr))
+        loader = importlib.machinery.SourceFileLoader('temp_py_mod', pathStr)
+        spec = importlib.util.spec_from_loader('temp_py_mod', loader)
+        module = importlib.util.module_from_spec(spec)
+        loader.exec_module(module)
+    except (Exception, SystemExit):
+        return {'ok': False, 'error': traceback.format_exc(limit=-4), 'deps': depPaths}
+    finally:
+        builtins.open = io.open = realOpen
+        sys.path[:] = pathBefore
+        os.chdir(cwdBefore)
+        for readPath in dict.fromkeys(readPaths):
+            if os.path.isfile(readPath) and isProjectLocalFile(readPath):
+                depPaths.append(os.path.realpath(readPath))
+        for moduleName in set(sys.modules) - modulesBefore:
+            moduleFile = getattr(sys.modules[moduleName], '__file__', None)
+            if moduleFile and isProjectLocalFile(moduleFile):
+                depPaths.append(os.path.realpath(moduleFile))
+                sys.modules.pop(moduleName, None)
+    values = {}
+    unencodable = []
+    for varName in varNames:
+        try:
+            values[varName] = encodeValue(getattr(module, varName, None))
+        except TypeError:
+            unencodable.append(varName)
+    return {'ok': True, 'vars': values, 'unencodable': unencodable, 'deps': depPaths}
+
+
+def main():
+    # keep the real stdout for the protocol, and send anything the evaluated code prints
+    # `- (including the output of any subprocesses it runs) to stderr instead
+    protocolOut = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    memoryLimitMb = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    if memoryLimitMb > 0:
+        try:
+            import resource
+            memoryLimit = memoryLimitMb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memoryLimit, memoryLimit))
+        except (ImportError, ValueError, OSError):
+            # e.g. on Windows, where the resource module is not available
+            pass
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            response = evaluate(request['path'], request['vars'])
+        except MemoryError:
+            response = {'ok': False, 'error': 'MemoryError: memory limit exceeded', 'deps': []}
+        except Exception:
+            response = {'ok': False, 'error': traceback.format_exc(limit=-2), 'deps': []}
+        protocolOut.write(json.dumps(response) + '\n')
+        protocolOut.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,14 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
 import os
+import sys
+import json
+import queue
+import inspect
+import threading
 import sublime
 import subprocess
 from threading import Thread
 
-import inspect
 def debuginfo(message, on=True):
     if on:
         caller = inspect.getframeinfo(inspect.stack()[1][0])
@@ -119,6 +124,154 @@ class shellCommandThreadObj(Thread):
 
 
 
+class workerProcessError(Exception):
+    """
+    Raised when a persistent worker process dies, or times out on a request
+    """
+    pass
+
+
+class workerStartError(workerProcessError):
+    """
+    Raised when a persistent worker process can't be started (e.g. its interpreter is not installed)
+    """
+    pass
+
+
+class persistentWorkerProcess():
+    """
+    A long lived worker subprocess, which answers requests sent as one line JSON objects on its stdin
+    `- with one line JSON responses on its stdout (so any start-up cost is paid once, not per request)
+    The worker is started on the first request, and restarted on the next request after it has died or
+    `- been killed. A request which is not answered within 'timeout' seconds kills the worker.
+    Requests are sent one at a time (callers from several threads are serialised)
+    """
+    def __init__(self, cmdTokens: list, timeout=10, processArgs={}):
+        self.cmdTokens = cmdTokens
+        self.timeout = timeout
+        self.processArgs = processArgs
+        self.process = None
+        self._responses = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        processArgs = dict(stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                           encoding='utf-8', bufsize=1)
+        if sys.platform == 'win32':
+            # don't flash up a console window
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            processArgs['startupinfo'] = startupinfo
+        processArgs.update(self.processArgs)
+        try:
+            self.process = subprocess.Popen(self.cmdTokens, **processArgs)
+        except Exception as err:
+            raise workerStartError(f'Unable to start worker process {self.cmdTokens[0]}: '
+                                     f'{err.__class__.__name__}: {err}') from err
+        # responses are read on a thread of their own, so a request can be timed out
+        self._responses = queue.Queue()
+        Thread(target=self._readResponses, args=(self.process, self._responses), daemon=True).start()
+
+    @staticmethod
+    def _readResponses(process, responses):
+        for line in process.stdout:
+            responses.put(line)
+        responses.put(None)
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+    def _stop(self):
+        # caller must hold self._lock
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait(timeout=5)
+            except Exception:
+                pass
+            self.process = None
+
+    def request(self, requestObj):
+        """
+        Send requestObj to the worker and return its (decoded JSON) response, or raise workerProcessError
+        """
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(json.dumps(requestObj) + '\n')
+                self.process.stdin.flush()
+                line = self._responses.get(timeout=self.timeout)
+            except queue.Empty:
+                self._stop()
+                raise workerProcessError(f'Worker process timed out after {self.timeout} seconds (it has been stopped)')
+            except OSError as err:
+                self._stop()
+                raise workerProcessError(f'Worker process failed: {err.__class__.__name__}: {err}') from err
+            if line is None:
+                returncode = self.process.wait()
+                self.process = None
+                raise workerProcessError(f'Worker process exited unexpectedly (exit code {returncode})')
+            try:
+                return json.loads(line)
+            except ValueError as err:
+                raise workerProcessError(f'Unreadable worker process response: {line[:200]}') from err
+
+
+def decodeWorkerValue(value):
+    # reverse the container tagging of lnk_pyVarsWorker.encodeValue
+    if isinstance(value, list):
+        return [decodeWorkerValue(v) for v in value]
+    if isinstance(value, dict):
+        (tag, items), = value.items()
+        if tag == '__tuple__':
+            return tuple(decodeWorkerValue(v) for v in items)
+        if tag == '__set__':
+            return set(decodeWorkerValue(v) for v in items)
+        return {decodeWorkerValue(k): decodeWorkerValue(v) for k, v in items}
+    return value
+
+
+class pyFileVarsWorker():
+    """
+    Extracts variables from python sourcefiles (e.g. conf.py) by running them in a persistent worker process
+    `- (see lnk_pyVarsWorker) rather than in the plugin host, so that:
+     - a sourcefile that hangs (e.g. on a git or network call) is stopped after 'timeout' seconds, not freezing sublime
+     - the modules it imports don't pollute the plugin host (and installed ones stay imported in the worker for next time)
+     - memory use is capped at memoryLimitMb (on platforms with the python 'resource' module, 0 for no limit)
+    """
+    def __init__(self, interpreterPathStr: str, timeout=10, memoryLimitMb=0):
+        self.settingsKey = None
+        self.worker = None
+        self.configure(interpreterPathStr, timeout, memoryLimitMb)
+
+    def configure(self, interpreterPathStr: str, timeout=10, memoryLimitMb=0):
+        settingsKey = (interpreterPathStr, memoryLimitMb)
+        if settingsKey != self.settingsKey:
+            if self.worker is not None:
+                self.worker.stop()
+            from . import lnk_pyVarsWorker
+            workerSourceStr = inspect.getsource(lnk_pyVarsWorker)
+            self.worker = persistentWorkerProcess([interpreterPathStr, '-c', workerSourceStr, str(memoryLimitMb)],
+                                                  timeout)
+            self.settingsKey = settingsKey
+        self.worker.timeout = timeout
+
+    def getVars(self, pyFilePathStr: str, varNames: list):
+        """
+        Run pyFilePathStr in the worker and return (tuple of varNames values, dependency paths)
+        `- the dependency paths being pyFilePathStr plus any project-local modules it imported
+        Raises workerProcessError if the worker fails, and RuntimeError if the sourcefile raised an exception
+        """
+        response = self.worker.request({'path': os.path.realpath(pyFilePathStr), 'vars': varNames})
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'unknown error'))
+        if response['unencodable']:
+            logger.warning(f'{pyFilePathStr} variables {response["unencodable"]} could not be passed back by the worker')
+        return (tuple(decodeWorkerValue(response['vars'].get(varName)) for varName in varNames),
+                response['deps'])
+
 class livingThreadStatusAnimator():
 
     """
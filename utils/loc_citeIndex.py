@@ -0,0 +1,312 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .lnk_fileUtils import walkFiles
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that citation files can be indexed/parsed outside of the plugin host
+
+# ".. [<cite_label>] <cite_text>" lines, the label must not begin with '#' or a digit (which would make it a footnote)
+# `- the cite_text may also start on the next (non blank) line, when nothing follows the label
+citationLinePattern = re.compile(rb"^\.\.\s+\[(?P<cite_label>[^#\d].*?)\](?P<cite_text>\s.*|)$")
+
+# citation texts are kept (and displayed) as previews of at most this many characters
+citationPreviewChars = 100
+
+# the files searched for citations under a folder given in bib_ref_file_list
+citationFileExtensions = ('.rst',)
+
+_globMagic = re.compile(r'[*?[]')
+
+
+def scanCitations(filename):
+    """
+    Scan the filename, a block (buffered read) at a time, for restructured text citation lines of the kind:
+       ".. [author_yr] Author, 1966 Great Book"
+    or in regex capture group terms:
+       ".. [<cite_label>] <cite_text>"
+    Care is taken to avoid footnotes, which have an almost identical syntax to citations.
+    The <cite_label> must not begin with a '#' or a numerical digit, or it will be deemed a footnote reference.
+    Yields a (cite_label, cite_text, filename, offset) record for each citation, offset being the byte offset
+    `- of its line in the file. Only lines passing a cheap '..' + '[' test are matched against the regex,
+     - and no more than one line is held in memory, so very large generated bibliographies can be scanned.
+    """
+    pending = None  # (cite_label, offset) of a citation whose text is on a following line
+    offset = 0
+    with open(filename, 'rb') as reffile:
+        for line in reffile:
+            lineOffset = offset
+            offset += len(line)
+            if pending is not None:
+                if not line.strip():
+                    continue
+                yield pending[0], line.strip().decode('utf-8', 'replace'), filename, pending[1]
+                pending = None
+            if not line.startswith(b'..') or b'[' not in line:
+                continue
+            found = citationLinePattern.match(line.rstrip(b'\r\n'))
+            if found is None:
+                continue
+            citeLabel = found.group('cite_label').decode('utf-8', 'replace')
+            citeText = found.group('cite_text').strip()
+            if citeText:
+                yield citeLabel, citeText.decode('utf-8', 'replace'), filename, lineOffset
+            else:
+                pending = (citeLabel, lineOffset)
+
+
+def citationPreview(citeText):
+    if len(citeText) <= citationPreviewChars:
+        return citeText
+    return citeText[:citationPreviewChars - 1] + '\u2026'
+
+
+def getCitationsFromFile(filename):
+    """
+    Return a { cite_label: (cite_text preview, offset) } dict of the citations of filename (None if there are none)
+    `- see scanCitations
+    """
+    found = {citeLabel: (citationPreview(citeText), offset)
+             for citeLabel, citeText, fileName, offset in scanCitations(filename)}
+    return found or None
+
+
+def citationEncodedPosition(realPathStr, offset):
+    """
+    Return the "file:line" position (as used by sublime's ENCODED_POSITION) of the citation line at the byte
+    `- offset of realPathStr, or None if the file can no longer be read
+    """
+    try:
+        with open(realPathStr, 'rb') as reffile:
+            lineNumber = reffile.read(offset).count(b'\n') + 1
+    except OSError:
+        return None
+    return f'{realPathStr}:{lineNumber}'
+
+
+def _globToRegex(patternStr):
+    # '**/' matches any number of folders, '*', '?' and '[...]' match within one folder name
+    regexParts = []
+    i = 0
+    while i < len(patternStr):
+        if patternStr.startswith('**/', i):
+            regexParts.append('(?:.*/)?')
+            i += 3
+        elif patternStr.startswith('**', i):
+            regexParts.append('.*')
+            i += 2
+        elif patternStr[i] == '*':
+            regexParts.append('[^/]*')
+            i += 1
+        elif patternStr[i] == '?':
+            regexParts.append('[^/]')
+            i += 1
+        elif patternStr[i] == '[' and ']' in patternStr[i + 2:]:
+            classEnd = patternStr.index(']', i + 2)
+            classStr = patternStr[i + 1:classEnd].replace('\\', '\\\\')
+            regexParts.append('[' + ('^' + classStr[1:] if classStr.startswith('!') else classStr) + ']')
+            i = classEnd + 1
+        else:
+            regexParts.append(re.escape(patternStr[i]))
+            i += 1
+    return re.compile(''.join(regexParts) + r'\Z')
+
+
+def expandCitationFileList(fileList, topFolderPath):
+    """
+    Expand the entries of a bib_ref_file_list (paths relative to topFolderPath) into a list of
+    `- (entry, file name, real file path) tuples, file name being the file path relative to topFolderPath:
+    - a file name is used as it is (whether or not the file exists)
+    - a folder stands for every citationFileExtensions file within it (and its sub folders)
+    - a glob pattern ('*', '?', '[...]', with '**/' for any number of folders) stands for the files it matches
+    Folder and glob matches are taken in sorted order, and a file is only listed once (at its first match).
+    """
+    expanded = []
+    seenPaths = set()
+
+    def addFile(entry, fileNameStr, realPathStr):
+        if realPathStr not in seenPaths:
+            seenPaths.add(realPathStr)
+            expanded.append((entry, fileNameStr, realPathStr))
+
+    def walkDir(dirPathStr, recursive=True):
+        # yield (path relative to dirPathStr, file name, real path) for each file found, in sorted order
+        # `- the folder is resolved once, the files found within it need no further path resolution
+        realDirStr = os.path.realpath(dirPathStr)
+        fileNameDirStr = os.path.relpath(dirPathStr, topFolderPath) if topFolderPath else dirPathStr
+        if fileNameDirStr == os.curdir:
+            fileNameDirStr = ''
+        for pathStr in sorted(walkFiles(realDirStr, recursive)):
+            relPathStr = pathStr[len(realDirStr):].lstrip(os.sep)
+            yield relPathStr, os.path.join(fileNameDirStr, relPathStr), pathStr
+
+    for entry in fileList:
+        entryPathStr = os.path.normpath(os.path.join(topFolderPath, entry))
+        if _globMagic.search(entry):
+            # the folders before the first glob part of the entry (not of topFolderPath, which may itself
+            # `- contain glob characters) are the folder to search
+            patternParts = os.path.normpath(entry).replace(os.sep, '/').split('/')
+            fixedCount = next(i for i, part in enumerate(patternParts) if _globMagic.search(part))
+            baseRelStr = '/'.join(patternParts[:fixedCount]) or ('/' if fixedCount else '')
+            baseDirStr = os.path.normpath(os.path.join(topFolderPath, baseRelStr))
+            relPatternStr = '/'.join(patternParts[fixedCount:])
+            matcher = _globToRegex(relPatternStr)
+            recursive = '/' in relPatternStr or '**' in relPatternStr
+            for relPathStr, fileNameStr, realPathStr in walkDir(baseDirStr, recursive):
+                if matcher.match(relPathStr.replace(os.sep, '/')):
+                    addFile(entry, fileNameStr, realPathStr)
+        elif os.path.isdir(entryPathStr):
+            for relPathStr, fileNameStr, realPathStr in walkDir(entryPathStr):
+                if realPathStr.endswith(citationFileExtensions):
+                    addFile(entry, fileNameStr, realPathStr)
+        else:
+            addFile(entry, entry, os.path.realpath(entryPathStr))
+    return expanded
+
+
+class citationPanelLists:
+    """
+    The merged citations of a list of bibliographic files, ready for the quick panel:
+    - insertList/displayList: the reST citation references and their "[label] = text preview" descriptions
+    - locationList: the (real file path, byte offset) of each citation's definition
+    - unreadableFiles/datalessFiles: the file names (relative to the project root) which were unreadable or
+      `- held no citations, and the folder/glob entries which matched no files
+    - fileCount: the number of files searched
+    A citation label found in more than one file takes the citation text of the last of them.
+    """
+    __slots__ = ('insertList', 'displayList', 'locationList', 'unreadableFiles', 'datalessFiles',
+                 'dataYieldingFileCount', 'fileCount')
+
+    def __init__(self, insertList, displayList, locationList, unreadableFiles, datalessFiles, dataYieldingFileCount,
+                 fileCount):
+        self.insertList = insertList
+        self.displayList = displayList
+        self.locationList = locationList
+        self.unreadableFiles = unreadableFiles
+        self.datalessFiles = datalessFiles
+        self.dataYieldingFileCount = dataYieldingFileCount
+        self.fileCount = fileCount
+
+
+class citationIndex:
+    """
+    Process-wide index of the citations of bibliographic files, so that only changed files are parsed again.
+    - Each file's citations are kept against its canonical path, and validated by a cheap os.stat (mtime, size) check
+    - New and changed files are scanned concurrently, on a bounded thread pool (file reads release the GIL)
+    - The merged panel lists are kept per (project root, file list) too, and reused until one of the files changes
+    Callers must not modify the lists they are given.
+    """
+
+    def __init__(self):
+        self._files = {}      # realPathStr: ((mtime_ns, size), { cite_label: (preview, offset) } or None)
+        self._merged = {}     # (topFolderPath, file list): (file stat keys, citationPanelLists)
+        self._lock = threading.Lock()
+
+    def _fileStatKey(self, realPathStr):
+        # (mtime_ns, size), or None for a missing file
+        try:
+            fileStat = os.stat(realPathStr)
+        except OSError:
+            return None
+        return fileStat.st_mtime_ns, fileStat.st_size
+
+    def _scanFile(self, realPathStr):
+        # return (citations or None, OSError or None)
+        try:
+            return getCitationsFromFile(realPathStr), None
+        except OSError as err:
+            return None, err
+
+    def refreshFile(self, realPathStr):
+        """
+        Scan an indexed file again if it has changed (e.g. just after it is saved), so that the next panel lists
+        `- need no scanning. Returns False (doing nothing) if the file is not in the index.
+        """
+        with self._lock:
+            cached = self._files.get(realPathStr)
+        if cached is None:
+            return False
+        statKey = self._fileStatKey(realPathStr)
+        if statKey is not None and statKey != cached[0]:
+            citations, err = self._scanFile(realPathStr)
+            if err is None:
+                with self._lock:
+                    self._files[realPathStr] = (statKey, citations)
+        return True
+
+    def getPanelLists(self, fileList, topFolderPath, maxWorkers=4):
+        """
+        Return the citationPanelLists of the bibliographic files, folders and glob patterns of fileList
+        `- (relative to topFolderPath, see expandCitationFileList)
+        """
+        expandedFiles = expandCitationFileList(fileList, topFolderPath)
+        fileKeys = [(entry, fileName, realPathStr, self._fileStatKey(realPathStr))
+                    for entry, fileName, realPathStr in expandedFiles]
+        mergedKey = (topFolderPath, tuple(fileList))
+        with self._lock:
+            merged = self._merged.get(mergedKey)
+            if merged is not None and merged[0] == fileKeys:
+                return merged[1]
+            staleFiles = {}
+            for entry, fileName, realPathStr, statKey in fileKeys:
+                cached = self._files.get(realPathStr)
+                if statKey is not None and (cached is None or cached[0] != statKey):
+                    staleFiles[realPathStr] = statKey
+
+        scanErrors = {}
+        if staleFiles:
+            startTime = time.perf_counter()
+            stalePaths = list(staleFiles)
+            workerCount = max(1, min(maxWorkers, len(stalePaths)))
+            if workerCount == 1:
+                results = [self._scanFile(realPathStr) for realPathStr in stalePaths]
+            else:
+                with ThreadPoolExecutor(max_workers=workerCount) as pool:
+                    results = list(pool.map(self._scanFile, stalePaths))
+            with self._lock:
+                for realPathStr, (citations, err) in zip(stalePaths, results):
+                    if err is None:
+                        self._files[realPathStr] = (staleFiles[realPathStr], citations)
+                    else:
+                        scanErrors[realPathStr] = err
+            logger.debug(f'Scanned {len(stalePaths)} citation file{"s"[:len(stalePaths) ^ 1]} in '
+                         f'{(time.perf_counter() - startTime) * 1000:.1f} ms using {workerCount} worker thread'
+                         f'{"s"[:workerCount ^ 1]}')
+
+        unreadableFiles = []
+        matchedEntries = {entryKey[0] for entryKey in fileKeys}
+        datalessFiles = [entry for entry in dict.fromkeys(fileList) if entry not in matchedEntries]
+        dataYieldingFileCount = 0
+        collectParseResult = {}
+        for entry, fileName, realPathStr, statKey in fileKeys:
+            if statKey is None or realPathStr in scanErrors:
+                unreadableFiles.append(fileName)
+                continue
+            with self._lock:
+                citations = self._files[realPathStr][1]
+            if citations:
+                collectParseResult.update((citeLabel, (preview, realPathStr, offset))
+                                          for citeLabel, (preview, offset) in citations.items())
+                dataYieldingFileCount += 1
+            else:
+                datalessFiles.append(fileName)
+
+        insertList = []
+        displayList = []
+        locationList = []
+        for cit, (preview, realPathStr, offset) in collectParseResult.items():
+            # the reST citation reference in correct syntax
+            insertList.append(f"[{cit}]_")
+            displayList.append(f"[{cit}] = {preview}")
+            locationList.append((realPathStr, offset))
+        panelLists = citationPanelLists(insertList, displayList, locationList, unreadableFiles, datalessFiles,
+                                        dataYieldingFileCount, len(fileKeys))
+        with self._lock:
+            self._merged[mergedKey] = (fileKeys, panelLists)
+        return panelLists
+
+
+citeIndex = citationIndex()
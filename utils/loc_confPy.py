@@ -0,0 +1,48 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import shutil
+import threading
+from .lnk_parsingUtils import getPyFileVars, getPyFileVarsWithoutRunning
+from .lnk_runnerUtils import pyFileVarsWorker
+from .loc_constants import settingsControl
+
+settings = settingsControl
+
+_confPyWorker = None
+_confPyWorkerLock = threading.Lock()
+
+
+def getConfPyWorker():
+    """
+    Return the shared worker process (a pyFileVarsWorker) that runs conf.py files, configured per plugin settings
+    `- or None if no python interpreter is available, in which case conf.py files are run in process
+    """
+    global _confPyWorker
+    interpreterPathStr = (settings.getOne('conf_py_interpreter')
+                          or shutil.which('python3') or shutil.which('python'))
+    if not interpreterPathStr:
+        return None
+    timeout = settings.getOne('conf_py_timeout_secs')
+    memoryLimitMb = settings.getOne('conf_py_memory_limit_mb')
+    with _confPyWorkerLock:
+        if _confPyWorker is None:
+            _confPyWorker = pyFileVarsWorker(interpreterPathStr, timeout, memoryLimitMb)
+        else:
+            _confPyWorker.configure(interpreterPathStr, timeout, memoryLimitMb)
+        return _confPyWorker
+
+
+def getConfPyVars(confPyPathStr, varNames):
+    """
+    Return a tuple with the values of varNames in a sphinx conf.py file (None for those not set)
+    `- see getPyFileVars: values are cached, determined statically where possible, and otherwise
+     - determined by running conf.py in a worker process (with a time and memory limit)
+    """
+    return getPyFileVars(confPyPathStr, varNames, worker=getConfPyWorker())
+
+
+def getConfPyVarsWithoutRunning(confPyPathStr, varNames):
+    """
+    Return a tuple with the values of varNames in a sphinx conf.py file if they are cached or can be determined
+    `- statically, or None if conf.py would have to be run (see getConfPyVars)
+    """
+    return getPyFileVarsWithoutRunning(confPyPathStr, varNames)
@@ -13,6 +13,46 @@ pluginSettingsSchema = {
                                  "default"  :   [],
                                  "checks"   :   ["is_list_of_zom_strings"]
                                 },
+    "rst_epilog_source_list":   {"profile"  :   "C",
+                                 "default"  :   [],
+                                 "checks"   :   ["is_list_of_zom_strings"]
+                                },
+    "inventory_cache_max_mb":   {"profile"  :   "A",
+                                 "default"  :   256,
+                                 "checks"   :   [("intWithinRange", 0, 65536)]
+                                },
+    "inventory_parse_workers":  {"profile"  :   "A",
+                                 "default"  :   4,
+                                 "checks"   :   [("intWithinRange", 1, 32)]
+                                },
+    "citation_scan_workers" :   {"profile"  :   "A",
+                                 "default"  :   4,
+                                 "checks"   :   [("intWithinRange", 1, 32)]
+                                },
+    "remote_inventory_fetch":   {"profile"  :   "A",
+                                 "default"  :   True,
+                                 "checks"   :   ["is_bool"]
+                                },
+    "remote_inventory_ttl_hours":   {"profile"  :   "A",
+                                 "default"  :   24,
+                                 "checks"   :   [("intWithinRange", 0, 8760)]
+                                },
+    "inventory_search_max_results": {"profile"  :   "A",
+                                 "default"  :   200,
+                                 "checks"   :   [("intWithinRange", 1, 10000)]
+                                },
+    "conf_py_interpreter"   :   {"profile"  :   "A",
+                                 "default"  :   "",
+                                 "checks"   :   ["is_str"]
+                                },
+    "conf_py_timeout_secs"  :   {"profile"  :   "A",
+                                 "default"  :   10,
+                                 "checks"   :   [("intWithinRange", 1, 600)]
+                                },
+    "conf_py_memory_limit_mb":  {"profile"  :   "A",
+                                 "default"  :   1024,
+                                 "checks"   :   [("intWithinRange", 0, 65536)]
+                                },
     "intersphinx_self_key"  :   {"profile"  :   "B",
                                  "default"  :   "",
                                  "checks"   :   ["is_str"]
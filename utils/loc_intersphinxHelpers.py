@@ -1,53 +1,85 @@
 from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
 import os
-import sys
-import zlib
-import re
-import logging
-from collections import defaultdict
-import inspect
+import time
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from .lnk_ioUtils import exceptionDetails
+from .loc_objInvParser import objInvFormatError
+from .loc_invCache import getCachedObjInvStore
 
 validRefTypesList = ['doc', 'label', 'term']
 
-def getThinIntersphinxMap(givenMap, relativePathStart, targetKeyList=[], oneFilePerKey=True):
+def getThinIntersphinxMap(givenMap, relativePathStart, targetKeyList=[], oneFilePerKey=True, remoteFetcher=None):
+    """
+    Return { intersphinx key: (objects.inv path, ...) } holding the usable objects.inv file(s) for each key
+    Local objects.inv locations are resolved relative to relativePathStart.
+    Remote locations - an http(s) url, or None meaning <webBaseUrl>/objects.inv (as per Sphinx intersphinx) -
+    `- are only used if a remoteFetcher (see loc_invFetcher) is given: its cached copy of the inventory is
+     - returned (even if stale), and missing/stale copies are fetched in the background for next time
+    """
     retDict = {}
+    remoteUrls = []
     if targetKeyList:
         # We have a limited list of target keys to parse
-        # Omit dictionary entries that do not match this target key list
-        for k in list(givenMap.keys()):
-            if k not in targetKeyList:
-                givenMap.pop(k, None)
+        # Omit dictionary entries that do not match this target key list (givenMap itself is left as it is)
+        givenMap = {k: v for k, v in givenMap.items() if k in targetKeyList}
     try:
         for shortname, invdata in givenMap.items():
-            logger.debug(f'Processing {len(invdata)} intersphinxMap object.inv location(s) for handle: {shortname}')
+            # data format = { shortname: (webBaseUrl, (tuple of obj.inv locations))}
+            # `- a single obj.inv location may also be given on its own, rather than in a tuple
+            invLocations = invdata[1]
+            if invLocations is None or isinstance(invLocations, str):
+                invLocations = (invLocations,)
+            logger.debug(f'Processing {len(invLocations)} intersphinxMap object.inv location(s) for handle: {shortname}')
             fq_file_list = []
-            for invpath in invdata[1]:
-                # data format = { shortname: (webBaseUrl, (tuple of obj.inv locations))}
-                if invpath is not None and not invpath.startswith('http'):
+            for invpath in invLocations:
+                if invpath is None or invpath.startswith('http'):
                     # 'None' as an invpath indicates there is an object.inv file at the webBaseUrl location
-                    # we are not interested in any remote/Url located object.inv files, only local ones
+                    if remoteFetcher is None:
+                        logger.debug(f'- Ignoring \"{invpath}\" (Non-file item).')
+                        continue
+                    invUrl = invpath if invpath is not None else f'{str(invdata[0]).rstrip("/")}/objects.inv'
+                    if not invUrl.startswith('http'):
+                        logger.debug(f'- Ignoring \"{invpath}\" (No remote url for {shortname}).')
+                        continue
+                    remoteUrls.append(invUrl)
+                    np = remoteFetcher.getCachedPath(invUrl)
+                    if np is None:
+                        logger.debug(f'- Skipping \"{invUrl}\" (Remote inventory not fetched yet).')
+                        continue
+                    logger.debug(f'- Adding \"{invUrl}\" (Cached copy of remote inventory).')
+                elif not str(invpath):
+                    continue
+                else:
                     try:
-                        np = os.path.normpath(os.path.join(relativePathStart, invpath))
+                        # canonicalise (resolving symlinks) so one objects.inv file always has one path
+                        # `- which lets the inventory caches parse and hold the file once, however it is referenced
+                        np = os.path.realpath(os.path.join(relativePathStart, invpath))
                     except Exception as err:
                         logger.debug(f'- Ignoring \"{invpath}\" due to {exceptionDetails(err)}')
                         continue
-                    if os.access(np, os.R_OK):
-                        logger.debug(f'- Adding \"{invpath}\" (Extant and readable file).')
-                        fq_file_list.append(np)
-                        if oneFilePerKey:
-                            logger.debug(f'- One file found for intersphinx {shortname} entry. Moving on as this is enough.')
-                            break
-                    else:
+                    if np in fq_file_list:
+                        logger.debug(f'- Ignoring \"{invpath}\" (Same file as an earlier location).')
+                        continue
+                    elif not os.access(np, os.R_OK):
                         logger.debug(f'- Ignoring \"{invpath}\" (File not readable).')
-                else:
-                    logger.debug(f'- Ignoring \"{invpath}\" (Non-file item).')
+                        continue
+                    logger.debug(f'- Adding \"{invpath}\" (Extant and readable file).')
+                fq_file_list.append(np)
+                if oneFilePerKey:
+                    logger.debug(f'- One file found for intersphinx {shortname} entry. Moving on as this is enough.')
+                    break
             if fq_file_list:
                 # save our object.inv path(s) in the correct format for returning
                 # old intersphinx format: retDict[shortname] = (invdata[0], tuple(fq_file_list))
                 retDict[shortname] = tuple(fq_file_list)
             else:
                 logger.info(f'Handle \"{shortname}\" yielded no usable objects.inv files')
+        if remoteUrls:
+            fetchingUrls = remoteFetcher.refreshInBackground(remoteUrls)
+            if fetchingUrls:
+                logger.debug(f'Fetching/revalidating {len(fetchingUrls)} remote inventories in the background')
     except Exception as err:
         logger.error(f'Failure parsing intersphinx map: {exceptionDetails(err)}')
         retDict = {}
@@ -55,6 +87,219 @@ def getThinIntersphinxMap(givenMap, relativePathStart, targetKeyList=[], oneFile
     print(f'retdict = {retDict}')
     return retDict
 
+# (domain, role) entry type: (reSt role used for insertion, label used in quick panel display)
+# `- entry types not listed here are inserted/displayed by their domain:role (see getEntryTypeRoleStrs)
+entryTypeRoleStrs = {
+    ('std', 'label'): ('ref', 'section'),
+    ('std', 'doc'): ('doc', 'page'),
+    ('std', 'term'): ('term', 'glossary_term')
+}
+
+def refTypeToEntryType(refType):
+    """
+    Convert a refType, as used in command args, to a (domain, role) entry type tuple
+    - the validRefTypesList refTypes 'doc', 'label' and 'term' belong to the standard (std) domain
+    - other refTypes must be given in full, as 'domain:role' e.g. 'py:class' or 'std:envvar'
+    return None for a malformed refType
+    """
+    if refType in validRefTypesList:
+        return ('std', refType)
+    domain, sep, role = refType.partition(':')
+    if not (sep and domain and role):
+        return None
+    return (domain, role)
+
+def getEntryTypeRoleStrs(entryType):
+    # return (reSt role, display label) for a (domain, role) entry type e.g. ('py', 'class') -> ('py:class', 'py:class')
+    roleStrs = entryTypeRoleStrs.get(entryType)
+    if roleStrs is None:
+        domain, role = entryType
+        roleStr = role if domain == 'std' else f'{domain}:{role}'
+        roleStrs = (roleStr, f'{domain}:{role}')
+    return roleStrs
+
+def getLinkPrefixes(intersphinx_key, is_cur_proj):
+    """
+    return (data_prefix, display_prefix) for links to the intersphinx_key project
+    links within the current project are inserted without a prefix, and displayed with a '*' prefix
+    """
+    if is_cur_proj:
+        return "", "*" + intersphinx_key + ":"
+    return intersphinx_key + ":", intersphinx_key + ":"
+
+def getObjInvStore(objInvPathStr, entryTypes=None):
+    """
+    Return an objInvStore of the (domain, role) entryTypes in the sphinx objects.inv file at objInvPathStr
+    `- entryTypes of None returns a complete store, which can then serve every entry type without reparsing
+    return None if there are errors processing the objects.inv file
+    Parsed entries are served from (and saved to) the inventory caches, see loc_invCache
+    """
+    try:
+        # only the requested entry types are parsed, cached stores are topped up as other variants are requested
+        return getCachedObjInvStore(objInvPathStr, entryTypes)
+    except objInvFormatError as err:
+        logger.error(f"Unable to parse intersphinx {objInvPathStr} inventory. {err}")
+    except Exception as err:
+        logger.error(f"Unable to parse intersphinx inventory [{objInvPathStr}]. {exceptionDetails(err)}")
+    return None
+
+
+def loadObjInvStores(invJobs, entryTypes=None, maxWorkers=4):
+    """
+    Load the objInvStores for a list of (intersphinx_key, objInvPathStr) jobs, concurrently on a bounded thread pool
+    - decompression (zlib) and file/cache I/O release the GIL, so cold loads of several inventories overlap
+    - results are returned in invJobs order (not completion order), so merged link lists are deterministic
+    - the time taken to load each inventory is logged
+    return a list of (intersphinx_key, objInvPathStr, store) tuples, store is None for an unusable objects.inv
+    """
+    def loadOne(invJob):
+        intersphinx_key, objInvPathStr = invJob
+        startTime = time.perf_counter()
+        store = getObjInvStore(objInvPathStr, entryTypes)
+        return intersphinx_key, objInvPathStr, store, time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    workerCount = max(1, min(maxWorkers, len(invJobs)))
+    if workerCount == 1:
+        results = [loadOne(invJob) for invJob in invJobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workerCount) as pool:
+            results = list(pool.map(loadOne, invJobs))
+    for intersphinx_key, objInvPathStr, store, elapsed in results:
+        logger.debug(f'- Intersphinx:{intersphinx_key} loaded {objInvPathStr} in {elapsed * 1000:.1f} ms')
+    logger.debug(f'Loaded {len(invJobs)} objects.inv inventories in {(time.perf_counter() - startTime) * 1000:.1f} ms '
+                 f'using {workerCount} worker thread{"s"[:workerCount ^ 1]}')
+    return [(intersphinx_key, objInvPathStr, store) for intersphinx_key, objInvPathStr, store, elapsed in results]
+
+
+class inventoryLinkList:
+    """
+    A read-only list of insertable links, built from entry type columns of one or more parsed inventories.
+    Each added segment is a (column, entry type, intersphinx key) combination - which acts as a
+    `- run-length encoded project/role column - so no per-link data is copied.
+    The reSt insert string is only formatted for the link that is finally chosen (see 'insertStr')
+    `- and display strings only for the rows handed to the quick panel (see 'displayStrs')
+    """
+    __slots__ = ('_segments', '_starts', '_count')
+
+    def __init__(self):
+        self._segments = []  # (column, roleStr, displayLabel, data_prefix, display_prefix)
+        self._starts = []    # index of the first link in each segment
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def addColumn(self, store, entryType, intersphinx_key="", is_cur_proj=False):
+        # the intersphinx prefixes are worked out here (at view time) as they differ between variants
+        column = store.getColumn(entryType)
+        if not len(column):
+            return 0
+        roleStr, displayLabel = getEntryTypeRoleStrs(entryType)
+        data_prefix, display_prefix = getLinkPrefixes(intersphinx_key, is_cur_proj)
+        self._segments.append((column, roleStr, displayLabel, data_prefix, display_prefix))
+        self._starts.append(self._count)
+        self._count += len(column)
+        return len(column)
+
+    def _locate(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError('inventoryLinkList index out of range')
+        segmentIndex = bisect_right(self._starts, index) - 1
+        return self._segments[segmentIndex], index - self._starts[segmentIndex]
+
+    def insertStr(self, index):
+        (column, roleStr, displayLabel, data_prefix, display_prefix), row = self._locate(index)
+        return f":{roleStr}:`{data_prefix}{column.names[row]}`"
+
+    def displayStr(self, index):
+        (column, roleStr, displayLabel, data_prefix, display_prefix), row = self._locate(index)
+        name, dispname = column.getRow(row)
+        return f"{display_prefix}>{displayLabel}: {dispname} ({roleStr}:{name})"
+
+    def insertStrs(self):
+        return [f":{roleStr}:`{data_prefix}{name}`"
+                for column, roleStr, displayLabel, data_prefix, display_prefix in self._segments
+                for name in column.names]
+
+    def displayStrs(self):
+        return [f"{display_prefix}>{displayLabel}: {dispname} ({roleStr}:{name})"
+                for column, roleStr, displayLabel, data_prefix, display_prefix in self._segments
+                for name, dispname in column.iterRows()]
+
+
+def syncInvSearchIndex(searchIndex, invJobs):
+    """
+    Bring the search index up to date with the objects.inv files of a list of (intersphinx_key, objInvPathStr) jobs
+    `- only new or changed inventories are (re)indexed, errors are logged and the inventory left as it was
+    """
+    startTime = time.perf_counter()
+    for objInvPathStr in dict.fromkeys(objInvPathStr for intersphinx_key, objInvPathStr in invJobs):
+        try:
+            if searchIndex.syncInventory(objInvPathStr):
+                logger.debug(f'- Indexed {objInvPathStr} for searching')
+        except objInvFormatError as err:
+            logger.error(f"Unable to index intersphinx {objInvPathStr} inventory. {err}")
+        except Exception as err:
+            logger.error(f"Unable to index intersphinx inventory [{objInvPathStr}]. {exceptionDetails(err)}")
+    logger.debug(f'Search index synced with {len(invJobs)} objects.inv inventories '
+                 f'in {(time.perf_counter() - startTime) * 1000:.1f} ms')
+
+
+def searchInventoryLinks(searchIndex, invJobs, queryStr, entryTypes=None, projSelfKey=None, limit=200):
+    """
+    Search the indexed inventories of a list of (intersphinx_key, objInvPathStr) jobs (see syncInvSearchIndex)
+    return 2 x lists with data/display entries for the best matches, best first
+    An inventory used by several intersphinx keys yields one link per key
+    """
+    pathKeys = {}
+    for intersphinx_key, objInvPathStr in invJobs:
+        pathKeys.setdefault(os.path.realpath(objInvPathStr), []).append(intersphinx_key)
+    # the current project's own links rank ahead of equally good matches from other projects
+    preferredPaths = [objInvPathStr for objInvPathStr, keys in pathKeys.items() if projSelfKey in keys]
+    insertStrs = []
+    displayStrs = []
+    for objInvPathStr, domain, role, name, dispname, priority, location in searchIndex.search(
+            queryStr, list(pathKeys), entryTypes, limit, preferredPaths):
+        roleStr, displayLabel = getEntryTypeRoleStrs((domain, role))
+        for intersphinx_key in pathKeys.get(objInvPathStr, ()):
+            data_prefix, display_prefix = getLinkPrefixes(intersphinx_key, intersphinx_key == projSelfKey)
+            insertStrs.append(f":{roleStr}:`{data_prefix}{name}`")
+            displayStrs.append(f"{display_prefix}>{displayLabel}: {dispname} ({roleStr}:{name})")
+    return insertStrs, displayStrs
+
+
+class inventoryLinkSearch:
+    """
+    An incremental search of the indexed inventories of a list of (intersphinx_key, objInvPathStr) jobs,
+    `- e.g. one search per keystroke as a query is typed (see searchInventoryLinks)
+    The index is brought up to date once, in the background (see startSync). Searches made meanwhile are
+    `- answered from what is already indexed, rather than waiting.
+    """
+
+    def __init__(self, searchIndex, invJobs, entryTypes=None, projSelfKey=None):
+        self.searchIndex = searchIndex
+        self.invJobs = invJobs
+        self.entryTypes = entryTypes
+        self.projSelfKey = projSelfKey
+        self._synced = threading.Event()
+
+    def startSync(self):
+        def sync():
+            try:
+                syncInvSearchIndex(self.searchIndex, self.invJobs)
+            finally:
+                self._synced.set()
+        threading.Thread(target=sync, name=f"{__package__.split('.')[0]}-search-sync", daemon=True).start()
+
+    def isSyncing(self):
+        return not self._synced.is_set()
+
+    def search(self, queryStr, limit):
+        # return 2 x lists with data/display entries for the best 'limit' matches of queryStr, best first
+        return searchInventoryLinks(self.searchIndex, self.invJobs, queryStr, self.entryTypes, self.projSelfKey, limit)
+
+
 def getObjInvDisplayLists(objInvPathStr,
                           refTypeTargetList=validRefTypesList,
                           intersphinx_key="",
@@ -63,115 +308,12 @@ def getObjInvDisplayLists(objInvPathStr,
     Parse a sphinx objects.inv file on the local filesystem at objInvPathStr
     return 2 x lists with data/display entries for the identified section of objects.inv
     return empty lists if there are errors processing the objects.inv file
+    Parsed entries are served from (and saved to) the inventory caches, see loc_invCache
     """
-    kosherLine1 = '# Sphinx inventory version 2'
-    datalist = []
-    displaylist = []
-    bufsize = 16 * 1024
-    display_prefix = intersphinx_key + ":"
-    data_prefix = intersphinx_key + ":"
-    if is_cur_proj:
-        display_prefix = "*" + display_prefix
-        data_prefix = ""
-
-    def read_chunks():
-        decompressor = zlib.decompressobj()
-        for chunk in iter(lambda: f.read(bufsize), b''):
-            yield decompressor.decompress(chunk)
-        yield decompressor.flush()
-
-    def split_lines(iter):
-        buf = b''
-        for chunk in iter:
-            buf += chunk
-            lineend = buf.find(b'\n')
-            while lineend != -1:
-                yield buf[:lineend].decode('utf-8')
-                buf = buf[lineend + 1:]
-                lineend = buf.find(b'\n')
-        assert not buf
-
-    try:
-        f = open(objInvPathStr, 'rb')
-        try:
-            # Sphinx v2 inventories begin with the following 4 uncompressed lines:
-            # Sphinx inventory version 2
-            # Project: <project name>
-            # Version: <full version number>
-            # The remainder of this file is compressed using zlib.
-            line = f.readline().rstrip().decode('utf-8')
-            logger.debug(f'line one = {line}')
-            if line == kosherLine1:
-                # set up some variables and constants
-                dataMappings = defaultdict(list)
-                displayMappings = defaultdict(list)
-                # The first line of the open file 'f' has already been read by the calling function
-                # read line 2 and extract 'projname'
-                line = f.readline()
-                # projname = line.rstrip()[11:].decode('utf-8')
-                # read line 3 and extract 'projname'
-                line = f.readline()
-                # version = line.rstrip()[11:].decode('utf-8')
-                # read line 4 and check for 'zlib' encoding notice
-                line = f.readline().decode('utf-8')
-                if 'zlib' not in line:
-                    logger.error("Badly formatted objects.inv file at {}\n\nNo zlib line(4)".format(objInvPathStr))
-                else:
-                    # main
-                    for line in split_lines(read_chunks()):
-                        # be careful to handle names with embedded spaces correctly
-                        m = re.match(r'(?x)(.+?)\s+(\S*:\S*)\s+(\S+)\s+(\S+)\s+(.*)',
-                                     line.rstrip())
-                        if not m:
-                            continue
-                        name, entrytype, prio, location, dispname = m.groups()
-                            
-                        # adjust any shorthand entries
-                        # - any $ terminating the location is shorthand for 'name'
-                        if location.endswith(u'$'):
-                            location = location[:-1] + name
-                        # - any -(dash) terminating the dispname is also shorthand for 'name'
-                        if dispname == "-":
-                            dispname = name
-
-                        if entrytype.startswith("std:"):
-                            # we are only concerned with the standard namespace entries (std)
-                            lineRefType = entrytype[4:]  # strip 'std:'
-                            if lineRefType in validRefTypesList:
-                                if lineRefType == "label":
-                                    insertStr = ":ref:`{}{}`".format(data_prefix, name)
-                                    displayStr = "{}>section: {} (ref:{})".format(display_prefix, dispname, name)
-                                elif lineRefType == "doc":
-                                    insertStr = ":doc:`{}{}`".format(data_prefix, name)
-                                    displayStr = "{}>page: {} (doc:{})".format(display_prefix, dispname, name)
-                                elif lineRefType == "term":
-                                    insertStr = ":term:`{}{}`".format(data_prefix, name)
-                                    displayStr = "{}>glossary_term: {} (term:{})".format(display_prefix, dispname, name)
-                                dataMappings[lineRefType].append(insertStr)
-                                displayMappings[lineRefType].append(displayStr)
-
-                    # if refTypeTarget in validRefTypesList:
-                    #     # build lists for a single refType
-                    #     datalist = dataMappings[refTypeTarget]
-                    #     displaylist = displayMappings[refTypeTarget]
-                    # else:
-                    #     # (default) build lists for all refTypes
-                    for x in refTypeTargetList:
-                        datalist.extend(dataMappings[x])
-                        displaylist.extend(displayMappings[x])
-
-                # datalist, displaylist = InsertSphinxLinksCommand.read_inventory_v2(f, refTypeTarget=refTypeTarget, \
-                    # display_prefix=display_prefix)
-            else:
-                logger.error('Unknown first line identifier in objects.inv file: {}\n\n'
-                                       'Identifier found: [{}]\n\n'
-                                       'Identifier expected: [{}]'.format(objInvPathStr, line, kosherLine1))
-        except Exception as err:
-            errDetails = lnk_ioUtils.exceptionDetails(err)
-            logger.error(f"Unable to parse intersphinx {objInvPathStr} inventory. {errDetails}")
-    except Exception as err:
-        errDetails = lnk_ioUtils.exceptionDetails(err)
-        logger.error(f"Unable to open intersphinx inventory [{objInvPathStr}]. {errDetails}")
-    finally:
-        f.close()
-        return datalist, displaylist
\ No newline at end of file
+    linkList = inventoryLinkList()
+    entryTypes = [refTypeToEntryType(x) for x in refTypeTargetList if x in validRefTypesList]
+    store = getObjInvStore(objInvPathStr, entryTypes)
+    if store is not None:
+        for entryType in entryTypes:
+            linkList.addColumn(store, entryType, intersphinx_key, is_cur_proj)
+    return linkList.insertStrs(), linkList.displayStrs()
@@ -0,0 +1,330 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+import sublime
+from .lnk_ioUtils import exceptionDetails
+from .loc_objInvParser import parseObjInvEntries
+from .loc_invStore import objInvStore
+from .loc_invFetcher import remoteInventoryFetcher
+from .loc_invIndex import inventorySearchIndex, searchIndexAvailable
+
+pluginName = __package__.split('.')[0]
+
+# Bump invCacheFormatVersion whenever the parsed entries format (or its meaning) changes
+# `- any cache record written with a different version is treated as a miss and overwritten
+invCacheFormatVersion = 3
+invCacheMagic = f'{pluginName}-objects.inv-cache'
+
+
+class inventoryLruCache:
+    """
+    Process-wide, bounded, in-memory LRU cache of parsed objects.inv stores.
+    - Keyed by canonical (real) objects.inv path, with each entry validated by a cheap os.stat (mtime, size) check
+    - A single module-level instance (invMemoryCache) is shared by every window and command variant
+    - Stores are also indexed by content hash, so byte identical inventories found at different paths
+      (copies kept for several projects, or several intersphinx keys) share a single store object
+    - The memory ceiling is an estimate of the bytes held by the cached stores (a shared store is counted once);
+      when exceeded the least recently used paths are evicted (the most recent path is always kept, however large)
+    """
+
+    def __init__(self, maxBytes=256 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self._entries = OrderedDict()  # realPathStr: (mtime_ns, size, sha1, store)
+        self._storeRefs = {}           # id(store): [store, number of paths using it, estBytes]
+        self._byHash = {}              # sha1: store
+        self._totalBytes = 0
+        self._lock = threading.Lock()
+
+    def setMaxBytes(self, maxBytes):
+        with self._lock:
+            self.maxBytes = maxBytes
+            if maxBytes <= 0:
+                self._clear()
+            self._evict()
+
+    def get(self, realPathStr, fileStat):
+        with self._lock:
+            cached = self._entries.get(realPathStr)
+            if cached is None:
+                return None
+            if cached[0] != fileStat.st_mtime_ns or cached[1] != fileStat.st_size:
+                # stale entry, the objects.inv file has changed
+                self._release(self._entries.pop(realPathStr))
+                return None
+            self._entries.move_to_end(realPathStr)
+            return cached[3]
+
+    def getByHash(self, contentHash):
+        # return the cached store parsed from an inventory with this content hash, or None
+        with self._lock:
+            return self._byHash.get(contentHash)
+
+    def put(self, realPathStr, fileStat, contentHash, store):
+        if self.maxBytes <= 0:
+            # in-memory caching is disabled
+            return
+        with self._lock:
+            previous = self._entries.pop(realPathStr, None)
+            if previous is not None:
+                self._release(previous)
+            storeRef = self._storeRefs.get(id(store))
+            if storeRef is None:
+                storeRef = self._storeRefs[id(store)] = [store, 0, store.nbytes()]
+                self._totalBytes += storeRef[2]
+            storeRef[1] += 1
+            self._byHash[contentHash] = store
+            self._entries[realPathStr] = (fileStat.st_mtime_ns, fileStat.st_size, contentHash, store)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        # caller must hold self._lock
+        self._entries.clear()
+        self._storeRefs.clear()
+        self._byHash.clear()
+        self._totalBytes = 0
+
+    def _release(self, entry):
+        # drop one path's reference to a store, freeing the store when no path uses it (caller must hold self._lock)
+        contentHash, store = entry[2], entry[3]
+        storeRef = self._storeRefs[id(store)]
+        storeRef[1] -= 1
+        if not storeRef[1]:
+            del self._storeRefs[id(store)]
+            self._totalBytes -= storeRef[2]
+            if self._byHash.get(contentHash) is store:
+                del self._byHash[contentHash]
+
+    def _evict(self):
+        # caller must hold self._lock
+        while self._totalBytes > self.maxBytes and len(self._entries) > 1:
+            evictedPath, evicted = self._entries.popitem(last=False)
+            self._release(evicted)
+            logger.debug(f'- Evicted {evictedPath} from the in-memory inventory cache')
+
+
+invMemoryCache = inventoryLruCache()
+
+
+def setInvMemoryCacheLimit(maxMegabytes):
+    """
+    Set the memory ceiling (in MB) of the shared in-memory inventory cache. Zero disables in-memory caching.
+    """
+    invMemoryCache.setMaxBytes(int(maxMegabytes) * 1024 * 1024)
+
+
+def getInvCacheDir():
+    """
+    Return (creating it if necessary) the folder under Sublime's cache path which holds parsed objects.inv records
+    """
+    cacheDir = os.path.join(sublime.cache_path(), pluginName, 'objects_inv')
+    os.makedirs(cacheDir, exist_ok=True)
+    return cacheDir
+
+
+_remoteInvFetcher = None
+
+
+def getRemoteInvFetcher(ttlHours=24):
+    """
+    Return the shared fetcher of remote (http) objects.inv files, caching them in a folder under Sublime's cache path
+    """
+    global _remoteInvFetcher
+    if _remoteInvFetcher is None:
+        _remoteInvFetcher = remoteInventoryFetcher(os.path.join(sublime.cache_path(), pluginName, 'remote_inv'))
+    _remoteInvFetcher.ttlSeconds = float(ttlHours) * 3600
+    return _remoteInvFetcher
+
+
+_invSearchIndex = None
+_invSearchIndexLock = threading.Lock()
+
+
+def getInvSearchIndex():
+    """
+    Return the shared search index of all intersphinx inventories (a database under Sublime's cache path),
+    `- or None if it is unavailable (no sqlite3 module, or the database cannot be opened)
+    """
+    global _invSearchIndex
+    if not searchIndexAvailable():
+        return None
+    with _invSearchIndexLock:
+        if _invSearchIndex is None:
+            indexDir = os.path.join(sublime.cache_path(), pluginName)
+            try:
+                os.makedirs(indexDir, exist_ok=True)
+                _invSearchIndex = inventorySearchIndex(os.path.join(indexDir, 'inventory_index.sqlite3'))
+            except Exception as err:
+                logger.error(f'Unable to open the inventory search index: {exceptionDetails(err)}')
+        return _invSearchIndex
+
+
+def fileContentHash(pathStr, bufsize=256 * 1024):
+    hasher = hashlib.sha1()
+    with open(pathStr, 'rb') as f:
+        for chunk in iter(lambda: f.read(bufsize), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _cacheRecordPath(realPathStr):
+    # one record file per canonical objects.inv path, named by a hash of that path
+    pathHash = hashlib.sha1(realPathStr.encode('utf-8')).hexdigest()
+    return os.path.join(getInvCacheDir(), f'{pathHash}.v{invCacheFormatVersion}.pickle')
+
+
+def _readCacheRecord(recordPathStr, realPathStr):
+    """
+    Return the cache record stored at recordPathStr, or None if it is absent, unreadable,
+    `- of a different format version, or belongs to a different objects.inv path
+    """
+    try:
+        with open(recordPathStr, 'rb') as f:
+            record = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        logger.debug(f'Ignoring unreadable objects.inv cache record {recordPathStr}: {exceptionDetails(err)}')
+        return None
+    if (not isinstance(record, dict)
+            or record.get('magic') != invCacheMagic
+            or record.get('version') != invCacheFormatVersion
+            or record.get('path') != realPathStr):
+        return None
+    return record
+
+
+def _writeCacheRecord(recordPathStr, record):
+    # write to a temporary file then rename, so readers never see a half written record
+    tmpPathStr = f'{recordPathStr}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmpPathStr, 'wb') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPathStr, recordPathStr)
+    except Exception as err:
+        logger.debug(f'Unable to write objects.inv cache record {recordPathStr}: {exceptionDetails(err)}')
+        try:
+            os.remove(tmpPathStr)
+        except OSError:
+            pass
+
+
+_loadLocks = {}
+_loadLocksLock = threading.Lock()
+
+
+def _getLoadLock(lockKey):
+    # one lock per objects.inv path, and one per content hash, so that concurrent loads of the same file
+    # `- (e.g. for two intersphinx keys) or of identical files (e.g. copies) parse the inventory once
+    with _loadLocksLock:
+        return _loadLocks.setdefault(lockKey, threading.Lock())
+
+
+def getCachedObjInvStore(objInvPathStr, entryTypes=None):
+    """
+    Return the parsed entries of an objects.inv file as an objInvStore (see parseObjInvEntries),
+    `- from the shared in-memory LRU cache, or else the on-disk cache if a valid record exists,
+     - otherwise by parsing the file (and caching the result in both)
+    Paths are canonicalised with os.path.realpath, and a store already parsed from a byte identical
+    `- inventory (same content hash) is shared rather than parsed again, so a file reached through several
+     - intersphinx keys, symlinks, copies or windows is parsed and held in memory once
+    entryTypes is a list of (domain, role) tuples, or None for every entry type (a complete store).
+    Only the requested entry types are parsed; those missing from a valid cached store are parsed on
+    `- demand and merged into it, so the cache fills out as different variants are used. Once a complete
+     - store is cached, every variant (including non-std domains) is served without further parsing.
+    A cache record is keyed on the canonical objects.inv path, and is valid for the file's mtime, size and
+    `- content hash. The content hash is only recomputed when the mtime/size differ from the record, so that
+     - a byte identical objects.inv (e.g. re-copied by a cron job) is still served from the cache
+    All cache failures degrade to a plain parse. Parse errors are passed through to the caller.
+    """
+    realPathStr = os.path.realpath(objInvPathStr)
+    with _getLoadLock(('path', realPathStr)):
+        fileStat = os.stat(realPathStr)
+        store = invMemoryCache.get(realPathStr, fileStat)
+        if store is not None and store.hasRoles(entryTypes):
+            logger.debug(f'- Using in-memory parse of {realPathStr}')
+            return store
+        store, contentHash = _getDiskCachedObjInvStore(realPathStr, fileStat, entryTypes, store or objInvStore())
+        sharedStore = invMemoryCache.getByHash(contentHash)
+        if sharedStore is not None and sharedStore.covers(store):
+            # hold one store object for all identical inventories
+            store = sharedStore
+        invMemoryCache.put(realPathStr, fileStat, contentHash, store)
+        return store
+
+
+def _topUpStore(realPathStr, fileStat, contentHash, store, entryTypes):
+    """
+    Return (store, True) with any missing entryTypes merged in, or (store, False) if none were missing
+    Missing entry types are taken from an in-memory store of identical content, if there is one, else parsed
+    `- (and the result published to the in-memory cache, before any concurrent load of identical content resumes)
+    """
+    if store.hasRoles(entryTypes):
+        return store, False
+    with _getLoadLock(('sha1', contentHash)):
+        sharedStore = invMemoryCache.getByHash(contentHash)
+        if sharedStore is not None:
+            logger.debug(f'- Sharing the in-memory parse of an identical inventory for {realPathStr}')
+            store = store.merged(sharedStore)
+        if entryTypes is None and not store.complete:
+            logger.debug(f'- Parsing all entries from {realPathStr}')
+            store = parseObjInvEntries(realPathStr)
+        elif not store.hasRoles(entryTypes):
+            missingEntryTypes = store.missingRoles(entryTypes)
+            logger.debug(f'- Parsing {missingEntryTypes} entries from {realPathStr}')
+            store = store.merged(parseObjInvEntries(realPathStr, missingEntryTypes))
+        invMemoryCache.put(realPathStr, fileStat, contentHash, store)
+    return store, True
+
+
+def _getDiskCachedObjInvStore(realPathStr, fileStat, entryTypes, knownStore):
+    """
+    Return (store, contentHash) with a store holding (at least) the requested entryTypes, starting from the
+    `- still valid 'knownStore', then topping up from a valid on-disk record, then from an identical in-memory
+     - inventory, and finally parsing any entry types still missing
+    """
+    try:
+        recordPathStr = _cacheRecordPath(realPathStr)
+    except Exception as err:
+        logger.debug(f'objects.inv cache unavailable: {exceptionDetails(err)}')
+        contentHash = fileContentHash(realPathStr)
+        return _topUpStore(realPathStr, fileStat, contentHash, knownStore, entryTypes)[0], contentHash
+
+    record = _readCacheRecord(recordPathStr, realPathStr)
+    contentHash = None
+    recordChanged = True
+    if record is not None:
+        if record['mtime_ns'] == fileStat.st_mtime_ns and record['size'] == fileStat.st_size:
+            logger.debug(f'- Using cached parse of {realPathStr}')
+            recordChanged = False
+        else:
+            contentHash = fileContentHash(realPathStr)
+            if record['sha1'] == contentHash:
+                logger.debug(f'- Using cached parse of {realPathStr} (content unchanged, refreshing mtime)')
+            else:
+                record = None
+    if record is None:
+        if contentHash is None:
+            contentHash = fileContentHash(realPathStr)
+        record = {
+            'magic': invCacheMagic,
+            'version': invCacheFormatVersion,
+            'path': realPathStr,
+            'sha1': contentHash,
+            'store': objInvStore()
+        }
+    record['mtime_ns'] = fileStat.st_mtime_ns
+    record['size'] = fileStat.st_size
+
+    store, toppedUp = _topUpStore(realPathStr, fileStat, record['sha1'],
+                                  record['store'].merged(knownStore), entryTypes)
+    if recordChanged or toppedUp:
+        record['store'] = store
+        _writeCacheRecord(recordPathStr, record)
+    return store, record['sha1']
@@ -0,0 +1,166 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that the fetcher can be exercised outside of the plugin host e.g. against a local http.server
+
+pluginName = __package__.split('.')[0]
+
+
+class remoteInventoryFetcher:
+    """
+    Fetches remote (http/https) objects.inv inventories into a local cache folder, off the UI thread.
+    - Each url is cached as <sha1(url)>.inv, with a <sha1(url)>.json sidecar holding its ETag/Last-Modified
+      validators and the time it was last fetched or revalidated
+    - A cached inventory older than 'ttlSeconds' is revalidated with a conditional GET (If-None-Match,
+      If-Modified-Since), so an unchanged inventory costs a '304 Not Modified' rather than a download
+    - Cached copies are always served as they are, even when stale or when the network is unavailable;
+      a refresh only ever replaces a cached copy with a newly downloaded, valid inventory
+    - Downloads run concurrently on a bounded thread pool, and a url is never fetched twice at the same time
+    - A url that could not be fetched is not retried for 'retrySeconds', so an unreachable server is not
+      `- contacted every time its inventory is wanted
+    """
+
+    def __init__(self, cacheDir, ttlSeconds=24 * 3600, timeout=10, maxWorkers=4, retrySeconds=300):
+        self.cacheDir = cacheDir
+        self.ttlSeconds = ttlSeconds
+        self.timeout = timeout
+        self.maxWorkers = maxWorkers
+        self.retrySeconds = retrySeconds
+        self._inflight = set()
+        self._failedAt = {}  # url: time of last failed fetch
+        self._lock = threading.Lock()
+
+    def _cachePaths(self, url):
+        urlHash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return (os.path.join(self.cacheDir, f'{urlHash}.inv'),
+                os.path.join(self.cacheDir, f'{urlHash}.json'))
+
+    def _readMeta(self, metaPathStr):
+        try:
+            with open(metaPathStr, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _writeAtomic(self, pathStr, data: bytes):
+        tmpPathStr = f'{pathStr}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmpPathStr, 'wb') as f:
+            f.write(data)
+        os.replace(tmpPathStr, pathStr)
+
+    def getCachedPath(self, url):
+        """
+        Return the local path of the cached copy of the inventory at 'url' (fresh or stale), or None if never fetched
+        """
+        invPathStr, metaPathStr = self._cachePaths(url)
+        return invPathStr if os.path.isfile(invPathStr) else None
+
+    def needsRefresh(self, url):
+        with self._lock:
+            failedAt = self._failedAt.get(url, 0)
+        if time.time() - failedAt < self.retrySeconds:
+            return False
+        invPathStr, metaPathStr = self._cachePaths(url)
+        if not os.path.isfile(invPathStr):
+            return True
+        fetchedAt = self._readMeta(metaPathStr).get('fetched_at', 0)
+        return time.time() - fetchedAt >= self.ttlSeconds
+
+    def fetch(self, url):
+        """
+        Download (or revalidate) the inventory at 'url' into the cache, blocking until done.
+        Returns True if a usable cached copy exists afterwards. Network and HTTP failures are logged, not raised.
+        """
+        try:
+            fetched = self._fetch(url)
+        except OSError as err:
+            logger.info(f'Unable to cache remote inventory {url}: {err.__class__.__name__}: {err}')
+            fetched = None
+        with self._lock:
+            if fetched is None:
+                self._failedAt[url] = time.time()
+            else:
+                self._failedAt.pop(url, None)
+        return bool(fetched) or self.getCachedPath(url) is not None
+
+    def _fetch(self, url):
+        # return True if fetched/revalidated, or None on failure
+        os.makedirs(self.cacheDir, exist_ok=True)
+        invPathStr, metaPathStr = self._cachePaths(url)
+        meta = self._readMeta(metaPathStr) if os.path.isfile(invPathStr) else {}
+        headers = {'User-Agent': f'{pluginName} (Sublime Text plugin)'}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+                responseHeaders = response.headers
+        except urllib.error.HTTPError as err:
+            if err.code == 304 and meta:
+                logger.debug(f'- Remote inventory unchanged (304): {url}')
+                meta['fetched_at'] = time.time()
+                self._writeAtomic(metaPathStr, json.dumps(meta).encode('utf-8'))
+                return True
+            logger.info(f'Unable to fetch remote inventory {url}: HTTP {err.code}'
+                        f'{" (serving cached copy)" if meta else ""}')
+            return None
+        except Exception as err:
+            logger.info(f'Unable to fetch remote inventory {url}: {err.__class__.__name__}: {err}'
+                        f'{" (serving cached copy)" if meta else ""}')
+            return None
+
+        if not data.startswith(b'# Sphinx inventory'):
+            logger.info(f'Ignoring remote inventory {url} as it is not a Sphinx objects.inv file')
+            return None
+        self._writeAtomic(invPathStr, data)
+        self._writeAtomic(metaPathStr, json.dumps({
+            'url': url,
+            'etag': responseHeaders.get('ETag'),
+            'last_modified': responseHeaders.get('Last-Modified'),
+            'fetched_at': time.time()
+        }).encode('utf-8'))
+        logger.debug(f'- Fetched remote inventory ({len(data)} bytes): {url}')
+        return True
+
+    def fetchAll(self, urls):
+        """
+        Fetch (or revalidate) several inventories concurrently, blocking until all are done.
+        urls already being fetched by another call are skipped. Returns { url: fetch result } for those fetched.
+        """
+        with self._lock:
+            urls = [url for url in dict.fromkeys(urls) if url not in self._inflight]
+            self._inflight.update(urls)
+        try:
+            if not urls:
+                return {}
+            with ThreadPoolExecutor(max_workers=max(1, min(self.maxWorkers, len(urls)))) as pool:
+                return dict(zip(urls, pool.map(self.fetch, urls)))
+        finally:
+            with self._lock:
+                self._inflight.difference_update(urls)
+
+    def refreshInBackground(self, urls, onDone=None):
+        """
+        Fetch (or revalidate) any of 'urls' whose cached copy is missing or older than the ttl, on a background thread.
+        onDone (if given) is called, on that background thread, with the fetchAll results.
+        Returns the list of urls scheduled for fetching.
+        """
+        staleUrls = [url for url in urls if self.needsRefresh(url)]
+        if staleUrls:
+            def worker():
+                results = self.fetchAll(staleUrls)
+                if onDone is not None:
+                    onDone(results)
+            threading.Thread(target=worker, name=f'{pluginName}-inv-fetch', daemon=True).start()
+        return staleUrls
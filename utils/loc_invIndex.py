@@ -0,0 +1,238 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import re
+import threading
+from .loc_objInvParser import iterObjInvEntries
+
+# sqlite3 is an optional part of some Python builds, the search index is simply unavailable without it
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that the search index can be built/queried outside of the plugin host
+
+# Bump indexSchemaVersion whenever the database layout changes, an index of any other version is rebuilt
+indexSchemaVersion = 2
+
+_createTablesSql = (
+    'CREATE TABLE IF NOT EXISTS inventories ('
+    ' id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' id INTEGER PRIMARY KEY, inv_id INTEGER NOT NULL, domain TEXT NOT NULL, role TEXT NOT NULL,'
+    ' name TEXT NOT NULL, dispname TEXT NOT NULL, priority INTEGER NOT NULL, location TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS entries_by_inventory ON entries (inv_id, domain, role)',
+    # (case insensitive) indexes for exact and prefix matches of whole names/display names
+    'CREATE INDEX IF NOT EXISTS entries_by_name ON entries (name COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS entries_by_dispname ON entries (dispname COLLATE NOCASE)'
+)
+# an external content FTS5 table (the text is held once, in 'entries') with prefix indexes for type-ahead queries
+# `- (of the first 1, 2 and 3 characters of each word, so that a word's first keystrokes are answered quickly)
+_createFtsSql = ("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                 "name, dispname, content='entries', content_rowid='id', prefix='1 2 3')")
+
+# entry types ranked above the rest (lower is better) when search matches are otherwise equally good
+entryTypeRanks = {('std', 'doc'): 0, ('std', 'label'): 1, ('std', 'term'): 2}
+
+# at most this many matches of each search tier are ranked, so broad (e.g. two letter) queries stay fast
+searchCandidateLimit = 500
+
+
+def searchIndexAvailable():
+    return sqlite3 is not None
+
+
+class inventorySearchIndex:
+    """
+    An on-disk SQLite database of the entries of many objects.inv inventories, for searching by name/display name.
+    - Each inventory (keyed by canonical path) is (re)indexed as a whole when its mtime or size changes, and
+      entries are streamed from the objects.inv straight into the database, so nothing is held in memory
+    - Entries are indexed by name and display name for exact and prefix matches, and full text indexed with
+      FTS5 where the sqlite3 library supports it (otherwise a slower LIKE scan is used). Matches are ranked
+      in tiers, by entry type, project and priority (see search)
+    - Intersphinx keys are not stored: one inventory may be reached through different keys in different
+      projects, so the caller maps the returned inventory paths back to its own keys (see searchInventoryLinks)
+    - Each thread uses its own connection, and writes are serialised (the database is in WAL mode, so
+      searches are never blocked by an inventory being indexed)
+    """
+
+    def __init__(self, dbPathStr):
+        self.dbPathStr = dbPathStr
+        self.hasFts = False
+        self._local = threading.local()
+        self._writeLock = threading.Lock()
+        with self._writeLock:
+            self._createSchema()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # autocommit mode, transactions are begun explicitly
+            conn = sqlite3.connect(self.dbPathStr, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _createSchema(self):
+        # caller must hold self._writeLock
+        conn = self._connection()
+        if conn.execute('PRAGMA user_version').fetchone()[0] != indexSchemaVersion:
+            for tableName in ('entries_fts', 'entries', 'inventories'):
+                conn.execute(f'DROP TABLE IF EXISTS {tableName}')
+        for sql in _createTablesSql:
+            conn.execute(sql)
+        try:
+            conn.execute(_createFtsSql)
+        except sqlite3.OperationalError as err:
+            logger.info(f'Full text search unavailable ({err}), the inventory search index will use slower scans')
+        self.hasFts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'").fetchone() is not None
+        conn.execute(f'PRAGMA user_version = {indexSchemaVersion}')
+
+    def _deleteEntries(self, conn, invId):
+        # caller must be within a write transaction
+        if self.hasFts:
+            conn.execute("INSERT INTO entries_fts (entries_fts, rowid, name, dispname)"
+                         " SELECT 'delete', id, name, dispname FROM entries WHERE inv_id = ?", (invId,))
+        conn.execute('DELETE FROM entries WHERE inv_id = ?', (invId,))
+
+    def syncInventory(self, objInvPathStr):
+        """
+        Bring the index of the objects.inv file at objInvPathStr up to date, (re)indexing it if its mtime
+        `- or size have changed since it was last indexed, and dropping it if the file no longer exists.
+        Returns True if the index was changed. Parse errors are passed through, leaving the index unchanged.
+        """
+        realPathStr = os.path.realpath(objInvPathStr)
+        conn = self._connection()
+        with self._writeLock:
+            row = conn.execute('SELECT id, mtime_ns, size FROM inventories WHERE path = ?', (realPathStr,)).fetchone()
+            try:
+                fileStat = os.stat(realPathStr)
+            except FileNotFoundError:
+                if row is None:
+                    return False
+                fileStat = None
+            if row is not None and fileStat is not None and (row[1], row[2]) == (fileStat.st_mtime_ns, fileStat.st_size):
+                return False
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if row is not None:
+                    invId = row[0]
+                    self._deleteEntries(conn, invId)
+                    if fileStat is None:
+                        conn.execute('DELETE FROM inventories WHERE id = ?', (invId,))
+                        conn.execute('COMMIT')
+                        return True
+                    conn.execute('UPDATE inventories SET mtime_ns = ?, size = ? WHERE id = ?',
+                                 (fileStat.st_mtime_ns, fileStat.st_size, invId))
+                else:
+                    invId = conn.execute('INSERT INTO inventories (path, mtime_ns, size) VALUES (?, ?, ?)',
+                                         (realPathStr, fileStat.st_mtime_ns, fileStat.st_size)).lastrowid
+                conn.executemany('INSERT INTO entries (inv_id, domain, role, name, dispname, priority, location)'
+                                 ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 ((invId, domain, role, name, dispname, priority, location)
+                                  for name, domain, role, priority, location, dispname
+                                  in iterObjInvEntries(realPathStr)))
+                if self.hasFts:
+                    conn.execute('INSERT INTO entries_fts (rowid, name, dispname)'
+                                 ' SELECT id, name, dispname FROM entries WHERE inv_id = ?', (invId,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return True
+
+    def search(self, queryStr, objInvPaths, entryTypes=None, limit=200, preferredPaths=()):
+        """
+        Return up to 'limit' entries, of the inventories at objInvPaths, matching queryStr, best matches first:
+        - entries whose name or display name is queryStr, then those beginning with queryStr
+          `- (both case insensitive), then those containing every word of queryStr (as a word prefix with
+           - full text search, as a substring otherwise)
+        - within each of these tiers, entries are ranked by entry type (see entryTypeRanks), then inventory
+          `- (those of preferredPaths first, e.g. the current project's), then (for word matches) the words
+           - found within the display name rather than just the name, then objects.inv priority, then the
+           - length of the display name
+        - each tier ranks at most searchCandidateLimit matches, so that very broad queries are answered quickly
+          `- (the first matches found, the word matches being scored only once capped), and later tiers are
+           - only searched if the earlier ones don't fill 'limit'
+        entryTypes is a list of (domain, role) tuples to restrict the search to, or None for all entry types
+        Returns a list of (objInvPathStr, domain, role, name, dispname, priority, location) tuples,
+        `- objInvPathStr being the canonical path of the inventory. Inventories not yet indexed are ignored.
+        """
+        queryStr = queryStr.strip()
+        words = re.findall(r'\w+', queryStr)
+        if not words or not objInvPaths:
+            return []
+        conn = self._connection()
+        realPaths = list(dict.fromkeys(os.path.realpath(p) for p in objInvPaths))
+        invPaths = dict(conn.execute(f'SELECT id, path FROM inventories WHERE path IN ({",".join("?" * len(realPaths))})',
+                                     realPaths))
+        if not invPaths:
+            return []
+        # (the unary + keeps the planner from preferring the inventory index to the name indexes)
+        conditions = [f'+e.inv_id IN ({",".join("?" * len(invPaths))})']
+        params = list(invPaths)
+        if entryTypes:
+            conditions.append('(' + ' OR '.join(['(e.domain = ? AND e.role = ?)'] * len(entryTypes)) + ')')
+            params += [part for entryType in entryTypes for part in entryType]
+        preferredPaths = {os.path.realpath(p) for p in preferredPaths}
+        preferredIds = [invId for invId, pathStr in invPaths.items() if pathStr in preferredPaths] or [0]
+        rankSql = ('CASE ' + ' '.join(f"WHEN domain = '{domain}' AND role = '{role}' THEN {rank}"
+                                       for (domain, role), rank in entryTypeRanks.items())
+                   + f' ELSE {len(entryTypeRanks)} END, '
+                   f'CASE WHEN inv_id IN ({",".join(str(invId) for invId in preferredIds)}) THEN 0 ELSE 1 END, '
+                   'score, priority, length(dispname)')
+        # (score is the match score of a word match, lower is better, and 0 for the other tiers)
+        columns = 'e.id, e.inv_id, e.domain, e.role, e.name, e.dispname, e.priority, e.location'
+
+        # each tier is a list of (sql, params) candidate queries, each query selecting up to searchCandidateLimit rows
+        whereSql = " AND ".join(conditions)
+        exactTier = []
+        prefixTier = []
+        for column in ('name', 'dispname'):
+            exactTier.append((f'SELECT {columns}, 0 AS score FROM entries e'
+                              f' WHERE e.{column} = ? COLLATE NOCASE AND {whereSql}',
+                              [queryStr] + params))
+            # a range scan of the case insensitive index finds the names beginning with queryStr
+            prefixTier.append((f'SELECT {columns}, 0 AS score FROM entries e WHERE e.{column} >= ? COLLATE NOCASE'
+                               f' AND e.{column} < ? COLLATE NOCASE AND {whereSql}',
+                               [queryStr, queryStr + '\U0010ffff'] + params))
+        # the word matches are scored by column: 2 for each word within the display name, 1 for one only within
+        # `- the name (so the lower, negated, score is the better)
+        wordPatterns = ['%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                        for word in words]
+        scoreSql = ('-(' + ' + '.join(["(CASE WHEN e.dispname LIKE ? ESCAPE '\\' THEN 2 ELSE 1 END)"] * len(words))
+                    + ')')
+        if self.hasFts:
+            # the full text matches are filtered (by inventory and entry type) and capped before they are scored,
+            # `- so a broad query never scores (or sorts) every entry it matches. (FTS5's bm25 is not used as it
+            #  - counts every entry matching each word, for its weights, before scoring a single match)
+            wordsTier = [(f'SELECT {columns}, {scoreSql} AS score FROM entries_fts'
+                          f' JOIN entries e ON e.id = entries_fts.rowid WHERE entries_fts MATCH ? AND {whereSql}',
+                          wordPatterns + [' '.join(f'"{word}"*' for word in words)] + params)]
+        else:
+            likeConditions = [whereSql]
+            likeParams = list(params)
+            for pattern in wordPatterns:
+                likeConditions.append("(e.name LIKE ? ESCAPE '\\' OR e.dispname LIKE ? ESCAPE '\\')")
+                likeParams += [pattern, pattern]
+            wordsTier = [(f'SELECT {columns}, {scoreSql} AS score FROM entries e WHERE {" AND ".join(likeConditions)}',
+                          wordPatterns + likeParams)]
+
+        results = []
+        seenIds = set()
+        # (a later tier is only searched if the earlier ones don't fill 'limit')
+        for tier in (exactTier, prefixTier, wordsTier):
+            tierSql = ' UNION '.join(f'SELECT * FROM ({querySql} LIMIT {searchCandidateLimit})'
+                                     for querySql, queryParams in tier)
+            tierParams = [param for querySql, queryParams in tier for param in queryParams]
+            sql = (f'SELECT id, inv_id, domain, role, name, dispname, priority, location FROM ({tierSql})'
+                   f' ORDER BY {rankSql} LIMIT ?')
+            for row in conn.execute(sql, tierParams + [limit]):
+                if row[0] not in seenIds:
+                    seenIds.add(row[0])
+                    results.append((invPaths[row[1]],) + row[2:])
+            if len(results) >= limit:
+                break
+        return results[:limit]
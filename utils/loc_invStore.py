@@ -0,0 +1,143 @@
+from array import array
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that the inventory store can be benchmarked/exercised outside of the plugin host
+
+
+class stringTable:
+    """
+    A compact, immutable, column of strings.
+    All strings are held end-to-end in one str object, and located by an array of (4 byte) start offsets,
+    `- rather than as one Python str object (49+ bytes of overhead each) per entry.
+    Individual strings are only created (sliced out) when they are accessed.
+    """
+    __slots__ = ('text', 'offsets')
+
+    def __init__(self, strings=()):
+        offsets = array('I', [0])
+        position = 0
+        for s in strings:
+            position += len(s)
+            offsets.append(position)
+        self.text = ''.join(strings)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        text = self.text
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield text[offsets[i]:offsets[i + 1]]
+
+    def __getstate__(self):
+        return (self.text, self.offsets)
+
+    def __setstate__(self, state):
+        self.text, self.offsets = state
+
+    def nbytes(self):
+        # approximate (a non-ascii text uses 2 or 4 bytes per character)
+        return 49 + len(self.text) + 64 + self.offsets.itemsize * len(self.offsets)
+
+
+class invRoleColumn:
+    """
+    The entries of a single role (e.g. std:label) within one objects.inv, as two parallel string tables.
+    A display name identical to the entry name (objects.inv '-' shorthand) is stored as an empty string.
+    """
+    __slots__ = ('names', 'dispnames')
+
+    def __init__(self, names, dispnames):
+        self.names = stringTable(names)
+        self.dispnames = stringTable(dispnames)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        return (self.names, self.dispnames)
+
+    def __setstate__(self, state):
+        self.names, self.dispnames = state
+
+    def getRow(self, index):
+        # return the (name, dispname) tuple for row 'index'
+        name = self.names[index]
+        return name, self.dispnames[index] or name
+
+    def iterRows(self):
+        for name, dispname in zip(self.names, self.dispnames):
+            yield name, dispname or name
+
+    def nbytes(self):
+        return self.names.nbytes() + self.dispnames.nbytes()
+
+
+class objInvStore:
+    """
+    A parsed objects.inv, held column-wise and indexed by entry type: { (domain, role): invRoleColumn }
+    e.g. ('std', 'label'), ('std', 'doc'), ('py', 'class'), ('c', 'macro')
+    A 'complete' store holds every entry type in the inventory, so any (domain, role) subset can be
+    `- served from it (an entry type absent from a complete store is simply empty).
+    An incomplete store only holds the entry types that have been parsed, and an absent entry type
+    `- is not the same as an empty one.
+    Stores are never modified once built (they are shared by caches and commands), use 'merged' to add entry types.
+    """
+    __slots__ = ('roleColumns', 'complete')
+
+    def __init__(self, roleColumns=None, complete=False):
+        self.roleColumns = roleColumns if roleColumns is not None else {}
+        self.complete = complete
+
+    def __getstate__(self):
+        return (self.roleColumns, self.complete)
+
+    def __setstate__(self, state):
+        self.roleColumns, self.complete = state
+
+    def hasRoles(self, entryTypes):
+        # entryTypes of None means all entry types i.e. a complete store
+        if self.complete:
+            return True
+        return entryTypes is not None and all(entryType in self.roleColumns for entryType in entryTypes)
+
+    def missingRoles(self, entryTypes):
+        if self.complete:
+            return []
+        return [entryType for entryType in entryTypes if entryType not in self.roleColumns]
+
+    def getColumn(self, entryType):
+        column = self.roleColumns.get(entryType)
+        if column is None:
+            if not self.complete:
+                raise KeyError(f'Entry type {entryType} has not been parsed into this store')
+            column = emptyRoleColumn
+        return column
+
+    def covers(self, other):
+        # True if this store holds every entry type that the 'other' store holds
+        if self.complete:
+            return True
+        return not other.complete and self.hasRoles(other.entryTypes())
+
+    def entryTypes(self):
+        return list(self.roleColumns.keys())
+
+    def merged(self, other):
+        # return a new store with the columns of both stores (those of 'other' take precedence)
+        if other.complete:
+            return other
+        if self.complete:
+            return self
+        return objInvStore({**self.roleColumns, **other.roleColumns})
+
+    def nbytes(self):
+        return 200 + sum(100 + column.nbytes() for column in self.roleColumns.values())
+
+
+emptyRoleColumn = invRoleColumn((), ())
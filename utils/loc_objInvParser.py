@@ -0,0 +1,258 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import sys
+import mmap
+import zlib
+import re
+from .loc_invStore import invRoleColumn, objInvStore
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that the parsing engine can be benchmarked/exercised outside of the plugin host
+
+kosherLine1 = '# Sphinx inventory version 2'
+readBufSize = 16 * 1024
+# objects.inv files up to this (compressed) size are memory mapped and decompressed in one shot
+# `- larger ones are streamed through a decompressor in readBufSize chunks, to bound memory use
+oneShotMaxFileSize = 4 * 1024 * 1024
+
+# objects.inv (v2) data line format: "name domain:role priority uri dispname"
+# `- be careful to handle names with embedded spaces correctly (hence the non-greedy name group)
+objInvLinePattern = re.compile(r'(.+?)\s+(\S*:\S*)\s+(\S+)\s+(\S+)\s+(.*)')
+
+# the (ascii) whitespace bytes that may follow an entrytype, in lines that objInvLinePattern matches
+entryTypeFollowingBytes = b' \t\x0b\x0c\r'
+
+
+class objInvFormatError(Exception):
+    """
+    Raised when an objects.inv file does not have a valid Sphinx v2 inventory header
+    """
+    pass
+
+
+def readObjInvHeader(f):
+    """
+    Read and check the 4 uncompressed header lines which begin every Sphinx v2 inventory:
+        # Sphinx inventory version 2
+        # Project: <project name>
+        # Version: <full version number>
+        # The remainder of this file is compressed using zlib.
+    The file object 'f' is left positioned at the start of the zlib compressed data.
+    Returns a (projname, version) tuple, or raises objInvFormatError.
+    """
+    return checkObjInvHeaderLines([f.readline() for _ in range(4)])
+
+
+def checkObjInvHeaderLines(headerLines):
+    # check the 4 (bytes) header lines of an objects.inv, see readObjInvHeader
+    line = headerLines[0].rstrip().decode('utf-8')
+    if line != kosherLine1:
+        raise objInvFormatError('Unknown first line identifier in objects.inv file.\n\n'
+                                f'Identifier found: [{line}]\n\n'
+                                f'Identifier expected: [{kosherLine1}]')
+    projname = headerLines[1].rstrip()[11:].decode('utf-8')
+    version = headerLines[2].rstrip()[11:].decode('utf-8')
+    if b'zlib' not in headerLines[3]:
+        raise objInvFormatError('Badly formatted objects.inv file. No zlib line(4)')
+    return projname, version
+
+
+def readMappedObjInvHeader(mm):
+    """
+    Check the 4 uncompressed header lines (see readObjInvHeader) directly on the mapped bytes 'mm'
+    Returns the offset of the start of the zlib compressed data, or raises objInvFormatError.
+    """
+    headerLines = []
+    linestart = 0
+    for _ in range(4):
+        lineend = mm.find(b'\n', linestart)
+        if lineend == -1:
+            lineend = len(mm) - 1
+        headerLines.append(mm[linestart:lineend + 1])
+        linestart = lineend + 1
+    checkObjInvHeaderLines(headerLines)
+    return linestart
+
+
+def iterObjInvFileBlocks(objInvPathStr, oneShotMaxSize=oneShotMaxFileSize):
+    """
+    Check the header of the objects.inv file at objInvPathStr then yield its decompressed body as
+    `- blocks of whole lines (bytes, each ending in b'\n'), using an I/O strategy picked by file size:
+    - small/medium files (up to oneShotMaxSize bytes) are memory mapped, the header is checked on the
+      mapped bytes, and the body is decompressed in one zlib.decompress call straight from the mapping
+      (no read copies, no per chunk decompressor calls) and yielded as a single block
+    - huge files are streamed in readBufSize chunks (see iterObjInvBlocks), so memory use stays bounded
+    """
+    with open(objInvPathStr, 'rb') as f:
+        fileSize = os.fstat(f.fileno()).st_size
+        if not 0 < fileSize <= oneShotMaxSize:
+            readObjInvHeader(f)
+            yield from iterObjInvBlocks(f)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            bodyStart = readMappedObjInvHeader(mm)
+            with memoryview(mm) as mappedBytes:
+                with mappedBytes[bodyStart:] as compressedBody:
+                    body = zlib.decompress(compressedBody)
+    if body:
+        yield body if body.endswith(b'\n') else body + b'\n'
+
+
+def iterObjInvBlocks(f, bufsize=readBufSize):
+    """
+    Yield the zlib compressed body of an objects.inv file as blocks of whole lines (bytes, each ending in b'\n').
+    Each chunk is decompressed exactly once, and only the (short) unterminated line fragment
+    `- at the end of a chunk is carried forward into the next block.
+     - this keeps the work linear in the size of the inventory, unlike re-slicing a growing buffer
+    """
+    decompressor = zlib.decompressobj()
+    remnant = b''
+    for chunk in iter(lambda: f.read(bufsize), b''):
+        buf = remnant + decompressor.decompress(chunk)
+        lineend = buf.rfind(b'\n')
+        if lineend == -1:
+            remnant = buf
+            continue
+        remnant = buf[lineend + 1:]
+        yield buf[:lineend + 1]
+    remnant += decompressor.flush()
+    if remnant:
+        yield remnant if remnant.endswith(b'\n') else remnant + b'\n'
+
+
+def iterBlocksLines(blocks):
+    """
+    Yield the decoded text lines of an iterable of objects.inv body blocks (see iterObjInvBlocks).
+    Each block is decoded exactly once (blocks are cut at line ends, so utf-8 characters are never split)
+    """
+    for block in blocks:
+        yield from block.decode('utf-8').split('\n')[:-1]
+
+
+def iterBlockLinesContaining(block, token, followingBytes=None):
+    """
+    Yield (as bytes) each line of 'block' which contains the bytes 'token'
+    `- followed by one of the bytes of followingBytes (if given) e.g. any whitespace
+    The search jumps from one token occurrence to the next, so lines without the token are never visited
+    `- let alone decoded or regex matched.
+    """
+    find = block.find
+    rfind = block.rfind
+    tokenLen = len(token)
+    pos = find(token)
+    while pos != -1:
+        if followingBytes is not None:
+            nextByte = block[pos + tokenLen:pos + tokenLen + 1]
+            if not nextByte or nextByte not in followingBytes:
+                pos = find(token, pos + 1)
+                continue
+        linestart = rfind(b'\n', 0, pos) + 1
+        lineend = find(b'\n', pos)
+        yield block[linestart:lineend]
+        pos = find(token, lineend)
+
+
+def splitEntryType(entrytype):
+    """
+    Split an objects.inv 'domain:role' entrytype string into an interned (domain, role) tuple
+    """
+    domain, _, role = entrytype.partition(':')
+    return sys.intern(domain), sys.intern(role)
+
+
+def iterObjInvEntries(objInvPathStr):
+    """
+    Yield every entry of the sphinx objects.inv file at objInvPathStr, in file order, as a full
+    `- (name, domain, role, priority, location, dispname) tuple, with the objects.inv shorthands expanded:
+     - a location ending in '$' has the '$' replaced by the name, and a '-' dispname is the name
+    Used where all entry fields are wanted (see loc_invIndex); parseObjInvEntries is leaner for link lists
+    Raises objInvFormatError for a badly formatted inventory
+    """
+    entryTypeKeys = {}  # entrytype str: interned (domain, role) tuple
+    matchLine = objInvLinePattern.match
+    for line in iterBlocksLines(iterObjInvFileBlocks(objInvPathStr)):
+        m = matchLine(line.rstrip())
+        if not m:
+            continue
+        name, entrytype, prio, location, dispname = m.groups()
+        entryType = entryTypeKeys.get(entrytype)
+        if entryType is None:
+            entryType = entryTypeKeys[entrytype] = splitEntryType(entrytype)
+        if location.endswith('$'):
+            location = location[:-1] + name
+        try:
+            priority = int(prio)
+        except ValueError:
+            priority = -1
+        yield name, entryType[0], entryType[1], priority, location, name if dispname == '-' else dispname
+
+
+def parseObjInvEntries(objInvPathStr, entryTypes=None):
+    """
+    Parse the sphinx objects.inv file at objInvPathStr and collect its entries, grouped by (domain, role)
+    If entryTypes is None, every entry of every domain (std:, py:, c: ...) is collected and the
+    `- returned store is flagged as complete, so any (domain, role) subset can later be served from it.
+    Otherwise only the (domain, role) entry types listed are collected, with filtering pushed down to the
+    `- byte level: only lines containing a b'domain:role ' token for a requested entry type are decoded
+     - and regex matched; all other lines are skipped without any per-line work
+    Returns an objInvStore holding one column per entry type, with rows in objects.inv file order
+    Raises objInvFormatError for a badly formatted inventory, and passes through any I/O or
+    `- decompression/decoding errors, so the caller can decide how to report them
+    """
+    blocks = iterObjInvFileBlocks(objInvPathStr)
+    if entryTypes is None:
+        columnLists = _collectAllEntries(blocks)
+    else:
+        columnLists = _collectEntriesOfTypes(blocks, entryTypes)
+    return objInvStore({entryType: invRoleColumn(names, dispnames)
+                        for entryType, (names, dispnames) in columnLists.items()},
+                       complete=entryTypes is None)
+
+
+def _collectAllEntries(blocks):
+    # { (domain, role): (names, dispnames) } for every line in the inventory
+    columnLists = {}
+    entryTypeKeys = {}  # entrytype str: interned (domain, role) tuple
+    matchLine = objInvLinePattern.match
+    for line in iterBlocksLines(blocks):
+        m = matchLine(line.rstrip())
+        if not m:
+            continue
+        name, entrytype, prio, location, dispname = m.groups()
+        entryType = entryTypeKeys.get(entrytype)
+        if entryType is None:
+            entryType = entryTypeKeys[entrytype] = splitEntryType(entrytype)
+            columnLists[entryType] = ([], [])
+        names, dispnames = columnLists[entryType]
+        # any -(dash) dispname is shorthand for 'name', and is stored as such (an empty string)
+        # `- (the location '$' shorthand is not expanded as the location isn't used)
+        names.append(name)
+        dispnames.append('' if dispname == '-' or dispname == name else dispname)
+    return columnLists
+
+
+def _collectEntriesOfTypes(blocks, entryTypes):
+    # { (domain, role): (names, dispnames) } for the requested entry types only
+    columnLists = {entryType: ([], []) for entryType in entryTypes}
+    # (byte level token, regex entrytype, names list, dispnames list) for each requested entry type
+    # `- the token being matched when followed by any (regex \s) whitespace, as the entrytype is in a line
+    typeTargets = [(f'{domain}:{role}'.encode('utf-8'), f'{domain}:{role}', names, dispnames)
+                   for (domain, role), (names, dispnames) in columnLists.items()]
+    matchLine = objInvLinePattern.match
+    if not typeTargets:
+        # nothing to collect, but the header is still checked (on reading the first block)
+        next(blocks, None)
+        return columnLists
+    for block in blocks:
+        for token, targetEntryType, names, dispnames in typeTargets:
+            for line in iterBlockLinesContaining(block, token, entryTypeFollowingBytes):
+                m = matchLine(line.decode('utf-8').rstrip())
+                if not m:
+                    continue
+                name, entrytype, prio, location, dispname = m.groups()
+                if entrytype != targetEntryType:
+                    # the token was found elsewhere in the line e.g. within a name
+                    continue
+                names.append(name)
+                dispnames.append('' if dispname == '-' or dispname == name else dispname)
+    return columnLists
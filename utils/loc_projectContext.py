@@ -0,0 +1,223 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+import sublime
+from .loc_confPy import getConfPyVars, getConfPyVarsWithoutRunning
+from .lnk_parsingUtils import pyVarsCache
+
+# the conf.py variables used by the plugin's commands, all read in one pass
+confPyVarNames = ('intersphinx_mapping', 'html_baseurl', 'intersphinx_resolve_self', 'rst_epilog', 'rst_prolog')
+
+# conf.py presence (or absence) in a folder is trusted for this long, before being checked again
+rootCacheSeconds = 30.0
+
+# repeated checks for the same view state within this time (e.g. the is_visible/is_enabled calls made while
+# `- building one context menu) are answered without any further file system or sublime API calls
+sameRequestSeconds = 1.0
+
+
+class projectRootIndex:
+    """
+    Finds the sphinx project root of a file: the nearest folder, at or above the file's folder, holding a conf.py
+    - whether each folder holds a conf.py is cached, for misses as well as hits (negative caching), so walking up
+      from files in the same (or nearby) folders costs no file system calls for rootCacheSeconds
+    - cached folders can be dropped early with 'invalidate' (e.g. when a conf.py is saved)
+    """
+
+    def __init__(self, cacheSeconds=rootCacheSeconds):
+        self.cacheSeconds = cacheSeconds
+        self._dirs = {}  # folder path: (holds a conf.py, time checked)
+        self._lock = threading.Lock()
+
+    def _hasConfPy(self, dirPathStr, now):
+        with self._lock:
+            cached = self._dirs.get(dirPathStr)
+        if cached is not None and now - cached[1] < self.cacheSeconds:
+            return cached[0]
+        hasConfPy = os.path.isfile(os.path.join(dirPathStr, 'conf.py'))
+        with self._lock:
+            self._dirs[dirPathStr] = (hasConfPy, now)
+        return hasConfPy
+
+    def findRoot(self, filePathStr):
+        # return the nearest folder, at or above filePathStr's folder, holding a conf.py (or None)
+        now = time.monotonic()
+        dirPathStr = os.path.dirname(os.path.abspath(filePathStr))
+        while True:
+            if self._hasConfPy(dirPathStr, now):
+                return dirPathStr
+            parentPathStr = os.path.dirname(dirPathStr)
+            if parentPathStr == dirPathStr:
+                return None
+            dirPathStr = parentPathStr
+
+    def invalidate(self, dirPathStr=None):
+        with self._lock:
+            if dirPathStr is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(dirPathStr, None)
+
+
+projectRoots = projectRootIndex()
+
+
+class projectContext:
+    """
+    Everything the plugin's commands need to know about a sphinx project, worked out in one pass:
+    - the project's root folder, and whether it has a readable conf.py
+    - the conf.py variables (see confPyVarNames)
+    One context is kept per project root (see getProjectContext), so several sphinx projects (including nested
+    `- ones) can be served in one window. A context is rebuilt when its conf.py (mtime, size, inode) changes,
+     - or any file its conf.py values were derived from (e.g. a local module imported by conf.py) changes
+       `- (see pyFileVarsCache)
+    Callers must not modify the conf.py values they are given.
+    """
+    __slots__ = ('topFolderPath', 'confPyPath', 'identity', 'hasConfPy', 'confPyVars', 'confPyDeps')
+
+    def __init__(self, topFolderPath, confPyPath, identity):
+        self.topFolderPath = topFolderPath
+        self.confPyPath = confPyPath
+        self.identity = identity
+        self.hasConfPy = identity[1] is not None and os.access(confPyPath, os.R_OK)
+        if self.hasConfPy:
+            self.confPyVars = dict(zip(confPyVarNames, getConfPyVars(confPyPath, list(confPyVarNames))))
+            self.confPyDeps = pyVarsCache.getDeps(os.path.realpath(confPyPath))
+        else:
+            self.confPyVars = dict.fromkeys(confPyVarNames)
+            self.confPyDeps = {}
+
+    def isCurrent(self, identity):
+        # is the context still valid for the given (topFolderPath, conf.py stat key) identity
+        # `- i.e. conf.py, and every other file its values were derived from, are unchanged
+        if self.identity != identity:
+            return False
+        return not self.confPyDeps or pyVarsCache.statDeps(self.confPyDeps) == self.confPyDeps
+
+    def getVar(self, varName):
+        return self.confPyVars[varName]
+
+    def isRstContext(self, view):
+        # is the (first) cursor of the view in a restructuredtext scope (memoised per view state, see getProjectContext)
+        with _viewRequestsLock:
+            viewRequest = _viewRequests.get(view.id())
+            isRst = viewRequest[3] if viewRequest is not None and viewRequest[2] is self else None
+        if isRst is None:
+            isRst = view.match_selector(view.sel()[0].begin(), "text.restructuredtext")
+            if viewRequest is not None and viewRequest[2] is self:
+                with _viewRequestsLock:
+                    viewRequest[3] = isRst
+        return isRst
+
+    def resolveProjSelfKey(self, selfKeySetting=""):
+        """
+        Return the intersphinx_mapping key of the project itself (or "" if it can't be identified), from:
+        `- the intersphinx_self_key setting, else conf.py 'intersphinx_resolve_self', else
+         - the intersphinx_mapping entry with the same web address (netloc) as conf.py 'html_baseurl'
+        """
+        if selfKeySetting:
+            return selfKeySetting
+        intersphinxMap = self.confPyVars['intersphinx_mapping'] or {}
+        projResolveSelf = self.confPyVars['intersphinx_resolve_self']
+        if projResolveSelf:
+            return projResolveSelf
+        projBaseurl = self.confPyVars['html_baseurl']
+        if projBaseurl:
+            projNetloc = urlsplit(projBaseurl).netloc
+            for isKey, isData in intersphinxMap.items():
+                if urlsplit(str(isData[0])).netloc == projNetloc:
+                    return isKey
+        return ""
+
+
+_contexts = {}      # project root folder: projectContext
+_pendingContexts = set()  # project root folders whose contexts are being built in the background
+_viewRequests = {}  # view id: [request key, request time, projectContext, is restructuredtext context]
+_viewRequestsLock = threading.Lock()
+_contextsLock = threading.Lock()
+
+
+def getProjectRoot(view):
+    """
+    Return the sphinx project root folder for a view: the nearest folder holding a conf.py, at or above the
+    `- view's file, or (for unsaved views and files outside any sphinx project) the window's first folder
+    """
+    fileName = view.file_name()
+    rootPathStr = projectRoots.findRoot(fileName) if fileName else None
+    if rootPathStr is None:
+        rootPathStr = view.window().extract_variables().get("folder", "")
+    return rootPathStr
+
+
+def getProjectContext(view, wait=True):
+    """
+    Return the projectContext for the sphinx project of 'view' (see getProjectRoot)
+    For a repeat request with an unchanged view (same view, change_count and selection) within
+    `- sameRequestSeconds, the context is returned straight away. Otherwise the project root is found
+     - (from the cached folder index) and its conf.py, and the files its values were derived from, are checked
+     - (a stat call each), the context being rebuilt only if one of these has changed.
+    With wait=False (e.g. for is_visible/is_enabled, on the UI thread) a context whose conf.py would have to be
+    `- run is built in the background instead, and None (not ready) is returned until it has been built
+    """
+    selection = view.sel()
+    firstRegion = selection[0] if len(selection) else None
+    requestKey = (view.change_count(), (firstRegion.a, firstRegion.b) if firstRegion is not None else None)
+    now = time.monotonic()
+    with _viewRequestsLock:
+        viewRequest = _viewRequests.get(view.id())
+    if viewRequest is not None and viewRequest[0] == requestKey and now - viewRequest[1] < sameRequestSeconds:
+        return viewRequest[2]
+
+    topFolderPath = getProjectRoot(view)
+    confPyPath = os.path.join(topFolderPath, 'conf.py')
+    statKey = None
+    if topFolderPath:
+        try:
+            confPyStat = os.stat(confPyPath)
+            statKey = (confPyStat.st_mtime_ns, confPyStat.st_size, confPyStat.st_ino)
+        except OSError:
+            pass
+    identity = (topFolderPath, statKey)
+    with _contextsLock:
+        context = _contexts.get(topFolderPath)
+    if context is None or not context.isCurrent(identity):
+        if (not wait and statKey is not None
+                and getConfPyVarsWithoutRunning(confPyPath, list(confPyVarNames)) is None):
+            _buildProjectContextAsync(topFolderPath, confPyPath, identity)
+            return None
+        context = _buildProjectContext(topFolderPath, confPyPath, identity)
+    with _viewRequestsLock:
+        _viewRequests[view.id()] = [requestKey, now, context, None]
+    return context
+
+
+def _buildProjectContext(topFolderPath, confPyPath, identity):
+    logger.debug(f'Reading sphinx project context for {topFolderPath}')
+    context = projectContext(topFolderPath, confPyPath, identity)
+    with _contextsLock:
+        _contexts[topFolderPath] = context
+    return context
+
+
+def _buildProjectContextAsync(topFolderPath, confPyPath, identity):
+    # build a project's context (once, however often it is asked for) on sublime's async thread
+    with _contextsLock:
+        if topFolderPath in _pendingContexts:
+            return
+        _pendingContexts.add(topFolderPath)
+
+    def build():
+        try:
+            _buildProjectContext(topFolderPath, confPyPath, identity)
+        finally:
+            with _contextsLock:
+                _pendingContexts.discard(topFolderPath)
+    sublime.set_timeout_async(build)
+
+
+def forgetView(view):
+    # drop the memoised request state of a (closed) view
+    with _viewRequestsLock:
+        _viewRequests.pop(view.id(), None)
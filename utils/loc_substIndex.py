@@ -0,0 +1,232 @@
+from .lnk_loggingUtils import getLogger; logger = getLogger(debug=True)
+import os
+import re
+import time
+import threading
+from .lnk_fileUtils import walkFiles
+
+# Note: This module deliberately avoids importing 'sublime' (directly or indirectly)
+# `- so that substitution sources can be indexed/parsed outside of the plugin host
+
+# ".. |<short>| <directive>:: <long>" substitution definitions e.g. replace::, image::, unicode::, date::
+# `- the directive's argument may also start on the next (indented) line
+substitutionPattern = re.compile(r"""
+    ^\.\.[ \t]+
+    \|(?P<short>[^|\n]+)\|
+    [ \t]+(?P<directive>[\w-]+)::
+    (?:[ \t]+(?P<long>\S.*?)|[ \t]*\n[ \t]+(?P<nextLong>\S.*?))?[ \t]*$
+    """, re.VERBOSE | re.MULTILINE)
+
+# the project files scanned for document-local substitution definitions (see substitutionIndex.indexProject)
+substitutionSourceExtensions = ('.rst',)
+
+# ".. include:: <path>" directives, a path in <angle brackets> being one of docutils' standard include files
+includePattern = re.compile(r"^\.\.\s+include::[ \t]+(?P<path>\S.*?)[ \t]*$", re.MULTILINE)
+
+
+def parseSubstitutionSource(text):
+    """
+    Return the substitution definitions and include directives of reST text, in the order they appear, as a list
+    `- of ('subst', short, long, directive) and ('include', path) items
+    """
+    items = [(found.start(), ('subst', found.group('short'), found.group('long') or found.group('nextLong') or '',
+                              found.group('directive')))
+             for found in substitutionPattern.finditer(text)]
+    items += [(found.start(), ('include', found.group('path'))) for found in includePattern.finditer(text)]
+    return [item for start, item in sorted(items, key=lambda startItem: startItem[0])]
+
+
+def substitutionDisplayStr(short, long, directive):
+    if directive == 'replace':
+        return "|{}| = {}".format(short, long)
+    return "|{}| = {}:: {}".format(short, directive, long).rstrip()
+
+
+class substitutionPanelLists:
+    """
+    The merged substitution definitions of a sphinx project, ready for the quick panel:
+    - insertList/displayList: the |substitution| references and their "|short| = long" descriptions
+      `- ("|short| = directive:: long" for substitutions other than replace::)
+    - sourcePaths: the real paths of the files the definitions were read from (including included files)
+    A substitution defined more than once takes the last definition found.
+    """
+    __slots__ = ('insertList', 'displayList', 'sourcePaths')
+
+    def __init__(self, insertList, displayList, sourcePaths):
+        self.insertList = insertList
+        self.displayList = displayList
+        self.sourcePaths = sourcePaths
+
+
+class substitutionIndex:
+    """
+    Process-wide index of the reST substitutions of sphinx projects, from reST text (e.g. conf.py rst_epilog and
+    `- rst_prolog values) and reST source files, following the '.. include::' directives within them.
+    - Each file is parsed into its definitions and include directives, kept against its canonical path and
+      `- (mtime, size). Together these form the dependency graph of the project's substitutions, and only
+       - files that have changed are parsed again
+    - The merged panel lists are kept per (project root, sources), and reused while the reST texts are the same
+      `- and no file of the dependency graph has changed (checked by an os.stat of each)
+    - The project's own reST files can be indexed too (see indexProject), in the background, so that the
+      `- definitions local to a document (in it, or in the files it includes) are found without reading the
+       - tree (see getDocumentPanelLists)
+    Callers must not modify the lists they are given.
+    """
+
+    def __init__(self):
+        self._files = {}    # realPathStr: ((mtime_ns, size), parsed items)
+        self._merged = {}   # (topFolderPath, sources): (reST texts, [(realPathStr, stat key)], substitutionPanelLists)
+        self._documents = {}  # (document realPathStr, topFolderPath): ([(realPathStr, stat key)], (insert, display))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fileStatKey(realPathStr):
+        try:
+            fileStat = os.stat(realPathStr)
+        except OSError:
+            return None
+        return fileStat.st_mtime_ns, fileStat.st_size
+
+    def _fileItems(self, realPathStr, statKey):
+        # return the parsed items of a file (None if it is unreadable), parsing it again only if it has changed
+        with self._lock:
+            cached = self._files.get(realPathStr)
+        if cached is not None and cached[0] == statKey:
+            return cached[1]
+        try:
+            with open(realPathStr, 'r', encoding='utf-8', errors='replace') as f:
+                items = parseSubstitutionSource(f.read())
+        except OSError as err:
+            logger.info(f'Unable to read substitution source {realPathStr}: {err}')
+            items = None
+        with self._lock:
+            self._files[realPathStr] = (statKey, items)
+        return items
+
+    def _collect(self, items, baseDirStr, sourcePathStr, topFolderPath, substitutions, graphFiles):
+        # merge the definitions of items (and of the files they include) into substitutions, as
+        # `- { short: (long, directive, path of the file defining it, or None for reST text) }
+        #  - adding every file visited, with its stat key, to graphFiles (each file is only visited once)
+        for item in items:
+            if item[0] == 'subst':
+                substitutions[item[1]] = (item[2], item[3], sourcePathStr)
+                continue
+            includePathStr = item[1]
+            if includePathStr.startswith('<'):
+                # docutils' standard substitution sets (e.g. <isonum.txt>) are not project sources
+                continue
+            if includePathStr.startswith('/'):
+                # as in sphinx, an 'absolute' include path is relative to the project's top folder
+                includePathStr = os.path.join(topFolderPath, includePathStr.lstrip('/'))
+            realPathStr = os.path.realpath(os.path.join(baseDirStr, includePathStr))
+            if realPathStr in graphFiles:
+                continue
+            self._visitFile(realPathStr, topFolderPath, substitutions, graphFiles)
+
+    def _visitFile(self, realPathStr, topFolderPath, substitutions, graphFiles):
+        statKey = self._fileStatKey(realPathStr)
+        graphFiles[realPathStr] = statKey
+        items = self._fileItems(realPathStr, statKey) if statKey is not None else None
+        if items:
+            self._collect(items, os.path.dirname(realPathStr), realPathStr, topFolderPath, substitutions, graphFiles)
+
+    def getPanelLists(self, topFolderPath, textSources, fileSources):
+        """
+        Return the substitutionPanelLists of a project, from:
+        - textSources: a list of (reST text, folder its includes are relative to) e.g. for conf.py rst_epilog
+        - fileSources: a list of reST files (relative to topFolderPath), read after the textSources
+        """
+        textSources = tuple(textSources)
+        mergedKey = (topFolderPath, tuple(fileSources))
+        with self._lock:
+            merged = self._merged.get(mergedKey)
+        if (merged is not None and merged[0] == textSources
+                and all(self._fileStatKey(realPathStr) == statKey for realPathStr, statKey in merged[1])):
+            return merged[2]
+
+        substitutions = {}
+        graphFiles = {}
+        for text, baseDirStr in textSources:
+            self._collect(parseSubstitutionSource(text), baseDirStr, None, topFolderPath, substitutions, graphFiles)
+        for fileSource in fileSources:
+            realPathStr = os.path.realpath(os.path.join(topFolderPath, fileSource))
+            if realPathStr not in graphFiles:
+                self._visitFile(realPathStr, topFolderPath, substitutions, graphFiles)
+
+        insertList = []
+        displayList = []
+        for shorty, (longy, directive, sourcePathStr) in substitutions.items():
+            insertList.append("|{}|".format(shorty))
+            displayList.append(substitutionDisplayStr(shorty, longy, directive))
+        panelLists = substitutionPanelLists(insertList, displayList,
+                                             [realPathStr for realPathStr, statKey in graphFiles.items() if statKey])
+        with self._lock:
+            self._merged[mergedKey] = (textSources, list(graphFiles.items()), panelLists)
+        return panelLists
+
+    def getDocumentPanelLists(self, docPathStr, topFolderPath, textSources, fileSources):
+        """
+        Return the substitutionPanelLists of the substitutions visible from the reST document at docPathStr:
+        `- the project's substitutions (see getPanelLists) plus those defined in the document itself or in the
+         - files it includes, the latter (shown with the file defining them) taking precedence
+        """
+        projectLists = self.getPanelLists(topFolderPath, textSources, fileSources)
+        realDocPathStr = os.path.realpath(docPathStr)
+        documentKey = (realDocPathStr, topFolderPath)
+        with self._lock:
+            document = self._documents.get(documentKey)
+        if document is not None and all(self._fileStatKey(realPathStr) == statKey for realPathStr, statKey in document[0]):
+            localInserts, localDisplays = document[1]
+        else:
+            substitutions = {}
+            graphFiles = {}
+            self._visitFile(realDocPathStr, topFolderPath, substitutions, graphFiles)
+            localInserts = []
+            localDisplays = []
+            for shorty, (longy, directive, sourcePathStr) in substitutions.items():
+                localInserts.append("|{}|".format(shorty))
+                sourceStr = ('this document' if sourcePathStr == realDocPathStr
+                             else os.path.relpath(sourcePathStr, topFolderPath))
+                localDisplays.append(f"{substitutionDisplayStr(shorty, longy, directive)}  [{sourceStr}]")
+            with self._lock:
+                self._documents[documentKey] = (list(graphFiles.items()), (localInserts, localDisplays))
+        if not localInserts:
+            return projectLists
+        localNames = set(localInserts)
+        insertList = list(localInserts)
+        displayList = list(localDisplays)
+        for insertStr, displayStr in zip(projectLists.insertList, projectLists.displayList):
+            if insertStr not in localNames:
+                insertList.append(insertStr)
+                displayList.append(displayStr)
+        return substitutionPanelLists(insertList, displayList, projectLists.sourcePaths)
+
+    def isDocumentIndexed(self, docPathStr):
+        # True if the (indexed) document defines or includes substitutions, without any file system calls
+        # `- beyond resolving its path
+        with self._lock:
+            cached = self._files.get(os.path.realpath(docPathStr))
+        return bool(cached is not None and cached[1])
+
+    def refreshFile(self, realPathStr):
+        # parse a (saved) reST file into the index if it is new or has changed
+        statKey = self._fileStatKey(realPathStr)
+        if statKey is not None:
+            self._fileItems(realPathStr, statKey)
+
+    def indexProject(self, topFolderPath):
+        """
+        Parse every substitutionSourceExtensions file under topFolderPath into the index (only new and changed
+        `- files are parsed), e.g. in the background when a project is opened
+        """
+        startTime = time.perf_counter()
+        fileCount = 0
+        for pathStr in walkFiles(os.path.realpath(topFolderPath)):
+            if pathStr.endswith(substitutionSourceExtensions):
+                self.refreshFile(pathStr)
+                fileCount += 1
+        logger.debug(f'Indexed substitutions of {fileCount} files under {topFolderPath} '
+                     f'in {(time.perf_counter() - startTime) * 1000:.1f} ms')
+
+
+substIndex = substitutionIndex()